@@ -21,7 +21,9 @@
 import pyzed.sl as sl
 import pyzed.sl_hub as hub
 import os
-from threading import Lock
+import queue
+import time
+from threading import Lock, Thread, Timer
 
 # Parameters, defined as global variables
 draw_bboxes = False
@@ -29,10 +31,29 @@ recordVideoEvent = True
 nbFramesNoDetBtw2Events = 30
 recordTelemetry = True
 telemetryFreq = 10.0
-sdk_guard = Lock()
 zed = sl.Camera()
 init_params = sl.InitParameters()
 
+# Camera changes requested from the ZED Hub callbacks threads, as (change, value) pairs. Callbacks read the new values
+# from ZED Hub and queue them, the grab thread applies them in one batch between two frames : callbacks never wait on
+# a grab, grab() needs no lock and the grab thread makes no ZED Hub request for them.
+pending_changes = queue.SimpleQueue()
+REOPEN_CAMERA = "reopen_camera"
+LOCAL_STREAM = "local_stream"
+
+# Video settings that can be modified on the cloud interface : application parameter, getter and type
+VIDEO_SETTINGS_PARAMETERS = {
+    sl.VIDEO_SETTINGS.LED_STATUS: ("led_status", hub.HubClient.get_parameter_bool, bool),
+    sl.VIDEO_SETTINGS.AEC_AGC: ("camera_auto_exposure", hub.HubClient.get_parameter_bool, bool),
+    sl.VIDEO_SETTINGS.EXPOSURE: ("camera_exposure", hub.HubClient.get_parameter_int, int),
+    sl.VIDEO_SETTINGS.GAIN: ("camera_gain", hub.HubClient.get_parameter_int, int),
+    sl.VIDEO_SETTINGS.GAMMA: ("camera_gamma", hub.HubClient.get_parameter_int, int),
+}
+
+# Last value of each video setting applied to the camera, written by the grab thread. Callbacks use it as the default
+# value of their parameter, so that they never call the camera
+video_settings_values = {}
+
 
 
 def on_video_event_update(message_received):
@@ -59,107 +80,125 @@ def on_telemetry_update(message_received):
         "New parameters : recordTelemetry or telemetryFreq modified", hub.LOG_LEVEL.INFO)
 
 
+#
+# \brief Coalesces the init parameters updates. Re-opening the camera stalls the stream for seconds, so the
+# camera is re-opened once, `delay` seconds after the last update of a burst, and only if the
+# resolution, the flip or the fps actually changed. Those can only be applied by opening the camera again.
+# The new values are read in a new InitParameters handed to the grab thread, the ones of the opened camera
+# (init_params) are only replaced by the grab thread once the camera is re-opened with them.
+#
+class ReconfigurationManager:
+    def __init__(self, delay=1.0):
+        self.lock = Lock()
+        self.delay = delay
+        self.timer = None
+
+    def request(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = Timer(self.delay, self.apply)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def apply(self):
+        with self.lock:
+            self.timer = None
+        new_params = copy_init_params(init_params)
+        update_init_params_from_cloud(new_params)
+        if init_params_key(new_params) == init_params_key(init_params):
+            hub.HubClient.send_log("Init parameters unchanged, the camera is not re-opened.", hub.LOG_LEVEL.INFO)
+        else:
+            hub.HubClient.send_log("Init parameters update. Re-opening the camera.", hub.LOG_LEVEL.INFO)
+        # Queued even if unchanged, so that it replaces a re-opening still pending with other values.
+        # The grab thread only re-opens the camera if they differ from the ones it is opened with.
+        pending_changes.put((REOPEN_CAMERA, new_params))
+
+reconfiguration = ReconfigurationManager()
+
+#
+# \brief Values of the init parameters that can be modified on the cloud interface
+#
+def init_params_key(init_params: sl.InitParameters):
+    return (init_params.camera_resolution, init_params.camera_image_flip, init_params.camera_fps)
+
+#
+# \brief New InitParameters with the values set by this sample
+#
+def copy_init_params(init_params: sl.InitParameters):
+    copy = sl.InitParameters()
+    copy.camera_resolution = init_params.camera_resolution
+    copy.camera_image_flip = init_params.camera_image_flip
+    copy.camera_fps = init_params.camera_fps
+    copy.depth_mode = init_params.depth_mode
+    copy.sdk_verbose = init_params.sdk_verbose
+    copy.sdk_gpu_id = init_params.sdk_gpu_id
+    copy.sensors_required = init_params.sensors_required
+    return copy
+
 #
 # \brief Callback generated when init parameters have been changed on the cloud interface
 # \param event from FunctionEvent
 #
 def on_init_param_change(message_received):
-    global sdk_guard
-    global zed
-    global init_params
+    reconfiguration.request()
+
+#
+# \brief Reads the new value of a video setting on ZED Hub and queues it for the grab thread
+#
+def queue_video_setting(setting):
+    parameter, get_parameter, value_type = VIDEO_SETTINGS_PARAMETERS[setting]
+    value = get_parameter(parameter, hub.PARAMETER_TYPE.APPLICATION, value_type(video_settings_values.get(setting, 0)))
+    pending_changes.put((setting, value))
 
-    hub.HubClient.send_log("Init parameters update. Re-opening the camera.", hub.LOG_LEVEL.INFO)
-    sdk_guard.acquire()
-    zed.close()
-    update_init_params_from_cloud(init_params)
-    zed.open(init_params)
-    sdk_guard.release()
 #
 # \brief Callback generated when led status have been changed on the cloud interface
 # \param event from FunctionEvent
 #
 def on_led_status_update(event : hub.FunctionEvent):
-    global zed
-    global sdk_guard    
-    curr_led_status = zed.get_camera_settings(sl.VIDEO_SETTINGS.LED_STATUS)
-    led_status = hub.HubClient.get_parameter_bool("led_status", hub.PARAMETER_TYPE.APPLICATION, bool(curr_led_status))
-    hub.HubClient.report_parameter("led_status", hub.PARAMETER_TYPE.APPLICATION, led_status)
-    zed.set_camera_settings(sl.VIDEO_SETTINGS.LED_STATUS, led_status)
+    queue_video_setting(sl.VIDEO_SETTINGS.LED_STATUS)
 
 #
 # \brief Callback generated when GAMMA video settings has been changed on the cloud interface
 # \param event from FunctionEvent
 #
 def on_gamma_update(message_received):
-    global sdk_guard
-    global zed
-    sdk_guard.acquire()
-    curr_gamma = zed.get_camera_settings(sl.VIDEO_SETTINGS.GAMMA)
-    gamma = hub.HubClient.get_parameter_int("camera_gamma", hub.PARAMETER_TYPE.APPLICATION, int(curr_gamma))
-    zed.set_camera_settings(sl.VIDEO_SETTINGS.GAMMA, gamma)
-    sdk_guard.release();
-    hub.HubClient.purge_video_stream()
-    hub.HubClient.report_parameter("camera_gamma", hub.PARAMETER_TYPE.APPLICATION, gamma);
+    queue_video_setting(sl.VIDEO_SETTINGS.GAMMA)
 
 #
-# \brief Callback generated when GAMMA video settings has been changed on the cloud interface
+# \brief Callback generated when GAIN video settings has been changed on the cloud interface
 # \param event from FunctionEvent
 #
 def on_gain_update(message_received):
-    global sdk_guard
-    global zed
-    sdk_guard.acquire();
-    curr_gain = zed.get_camera_settings(sl.VIDEO_SETTINGS.GAIN)
-    gain = hub.HubClient.get_parameter_int("camera_gain", hub.PARAMETER_TYPE.APPLICATION, int(curr_gain))
-    zed.set_camera_settings(sl.VIDEO_SETTINGS.GAIN, gain)
-    sdk_guard.release();
-    hub.HubClient.purge_video_stream()
-    hub.HubClient.report_parameter("camera_gain", hub.PARAMETER_TYPE.APPLICATION, gain)
-
+    queue_video_setting(sl.VIDEO_SETTINGS.GAIN)
 
 #
 # \brief Callback generated when AEC/AGC video settings has been changed on the cloud interface
 # \param event from FunctionEvent
 #
 def on_autoexposure_update(message_received):
-
-    global sdk_guard
-    global zed
-    sdk_guard.acquire()
-    curr_auto_exposure = zed.get_camera_settings(sl.VIDEO_SETTINGS.AEC_AGC)
-    auto_exposure = hub.HubClient.get_parameter_bool("camera_auto_exposure", hub.PARAMETER_TYPE.APPLICATION, bool(curr_auto_exposure));
-    zed.set_camera_settings(sl.VIDEO_SETTINGS.AEC_AGC, auto_exposure)
-    sdk_guard.release()
-    hub.HubClient.purge_video_stream()
-    hub.HubClient.report_parameter("camera_auto_exposure", hub.PARAMETER_TYPE.APPLICATION, auto_exposure);
-
+    queue_video_setting(sl.VIDEO_SETTINGS.AEC_AGC)
 
 #
 # \brief Callback generated when Exposure video settings has been changed on the cloud interface
 # \param event from FunctionEvent
 #
 def on_exposure_update(message_received):
-    global sdk_guard
-    global zed
-    sdk_guard.acquire()
-    curr_exposure = zed.get_camera_settings(sl.VIDEO_SETTINGS.EXPOSURE)
-    exposure = hub.HubClient.get_parameter_int("camera_exposure", hub.PARAMETER_TYPE.APPLICATION, int(curr_exposure))
-    zed.set_camera_settings(sl.VIDEO_SETTINGS.EXPOSURE, exposure)
-    sdk_guard.release()
-    hub.HubClient.purge_video_stream()
-    hub.HubClient.report_parameter("camera_exposure", hub.PARAMETER_TYPE.APPLICATION, exposure)
-
+    queue_video_setting(sl.VIDEO_SETTINGS.EXPOSURE)
 
 #
 # \brief Callback generated when the ap parameter local_stream has been modified in the interface.
-# the stream mode of the zed is enabled or disabled depending on the value
 # \param event from FunctionEvent
 #
 def on_local_stream_update(message_received):
-    global sdk_guard
-    global zed
-    local_stream_change = True
     local_stream = hub.HubClient.get_parameter_bool("local_stream", hub.PARAMETER_TYPE.APPLICATION, False)
+    pending_changes.put((LOCAL_STREAM, local_stream))
+
+#
+# \brief The stream mode of the zed is enabled or disabled depending on the local_stream value
+#
+def update_local_stream(local_stream):
+    global zed
 
     if local_stream:
         stream_param = sl.StreamingParameters()
@@ -175,6 +214,97 @@ def on_local_stream_update(message_received):
     else:
         zed.disable_streaming()
 
+#
+# \brief Groups the video settings changes of a short window, like a user dragging several sliders.
+# Each purge of the video stream forces a keyframe and a bitrate spike : the settings of the window are all
+# applied to the camera by the grab thread, then the stream is purged once and every changed parameter is
+# reported to ZED Hub from the batcher thread, so that grab() never waits on these requests.
+#
+class SettingsBatcher:
+    # camera : the sl.Camera the settings are applied to
+    # client : hub.HubClient, or a stand-in with the same purge_video_stream and report_parameter methods
+    def __init__(self, camera, client=hub.HubClient, window=0.3):
+        self.camera = camera
+        self.client = client
+        self.window = window
+        self.settings = {}
+        self.first_change_time = None
+        # (changed parameters, purge) of each flush, sent by the batcher thread
+        self.reports = queue.SimpleQueue()
+        self.thread = Thread(target=self.report_loop, daemon=True)
+        self.thread.start()
+
+    def add(self, setting, value):
+        if self.first_change_time is None:
+            self.first_change_time = time.monotonic()
+        self.settings[setting] = value
+
+    def is_due(self):
+        return self.first_change_time is not None and time.monotonic() - self.first_change_time >= self.window
+
+    # Called by the grab thread : only camera calls
+    def flush(self):
+        changed_parameters = []
+        purge = False
+        for setting, value in self.settings.items():
+            self.camera.set_camera_settings(setting, value)
+            video_settings_values[setting] = value
+            changed_parameters.append((VIDEO_SETTINGS_PARAMETERS[setting][0], value))
+            purge = purge or setting != sl.VIDEO_SETTINGS.LED_STATUS
+        self.settings = {}
+        self.first_change_time = None
+        self.reports.put((changed_parameters, purge))
+
+    def report_loop(self):
+        while True:
+            changed_parameters, purge = self.reports.get()
+            if purge:
+                self.client.purge_video_stream()
+            for parameter, value in changed_parameters:
+                self.client.report_parameter(parameter, hub.PARAMETER_TYPE.APPLICATION, value)
+
+# Created by main() once the camera is open
+settings_batcher = None
+
+#
+# \brief Applies the changes queued by the callbacks, called by the grab thread between two frames.
+# Several updates of the same setting are applied once, with the latest value.
+# Video settings are handed to the settings batcher, applied once its window is over.
+#
+def apply_pending_changes():
+    global zed
+    global init_params
+
+    changes = {}
+    while True:
+        try:
+            change, value = pending_changes.get_nowait()
+            changes[change] = value
+        except queue.Empty:
+            break
+
+    new_params = changes.get(REOPEN_CAMERA)
+    if new_params is not None and init_params_key(new_params) != init_params_key(init_params):
+        zed.close()
+        status = zed.open(new_params)
+        if status == sl.ERROR_CODE.SUCCESS:
+            init_params = new_params
+        else:
+            # Back to the last values the camera was opened with. init_params is unchanged,
+            # so a new update with the same values from the cloud interface is tried again.
+            hub.HubClient.send_log("Camera re-opening error : " + str(status) + ", back to the previous init parameters", hub.LOG_LEVEL.ERROR)
+            zed.close()
+            status = zed.open(init_params)
+            if status != sl.ERROR_CODE.SUCCESS:
+                hub.HubClient.send_log("Camera re-opening error : " + str(status), hub.LOG_LEVEL.ERROR)
+
+    if LOCAL_STREAM in changes:
+        update_local_stream(changes[LOCAL_STREAM])
+
+    for setting, value in changes.items():
+        if setting in VIDEO_SETTINGS_PARAMETERS:
+            settings_batcher.add(setting, value)
+
 
 def update_init_params_from_cloud(init_params: sl.InitParameters):
     reso_str = hub.HubClient.get_parameter_string(
@@ -203,9 +333,9 @@ def update_init_params_from_cloud(init_params: sl.InitParameters):
 
 
 def main():
-    global sdk_guard
     global zed
     global init_params
+    global settings_batcher
 
     # Create ZED Object
     zed = sl.Camera()
@@ -248,6 +378,11 @@ def main():
             "Camera initialization error : " + str(status), hub.LOG_LEVEL.ERROR)
         exit(1)
 
+    # Video settings of the camera, default values of the callbacks
+    for setting in VIDEO_SETTINGS_PARAMETERS:
+        video_settings_values[setting] = zed.get_camera_settings(setting)
+    settings_batcher = SettingsBatcher(zed, hub.HubClient)
+
     # Register the camera once it's open
     update_params = hub.UpdateParameters()
     status_hub = hub.HubClient.register_camera(zed, update_params)
@@ -310,11 +445,13 @@ def main():
     # Main loop
     while True:
 
-        # the callback on_init_param_change might close and reopen the camera to load new init params
-        # this mutex block the grab until the callback releases it
-        sdk_guard.acquire()
+        # Apply the settings changed on the cloud interface since the last frame, the camera may be re-opened
+        if not pending_changes.empty():
+            apply_pending_changes()
+        if settings_batcher.is_due():
+            settings_batcher.flush()
+
         status_zed = zed.grab()
-        sdk_guard.release()
 
         if status_zed == sl.ERROR_CODE.SUCCESS:
             hub.HubClient.update(zed)
@@ -0,0 +1,222 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_camera_settings.py
+# The ZED SDK is not needed : main.py is loaded with a fake pyzed, a fake camera and a fake ZED Hub client
+# whose requests take HUB_LATENCY seconds, like a remote call.
+
+import enum
+import importlib.util
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+HUB_LATENCY = 0.1
+GRAB_DURATION = 0.01
+
+
+class VIDEO_SETTINGS(enum.Enum):
+    LED_STATUS = 0
+    AEC_AGC = 1
+    EXPOSURE = 2
+    GAIN = 3
+    GAMMA = 4
+
+
+# One per test, the batcher threads of the previous tests may still be reporting to theirs
+class FakeHubClient:
+    def __init__(self, latency=HUB_LATENCY):
+        self.latency = latency
+        self.parameters = {}
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def request(self, name, *args):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls.append((name, threading.current_thread().name) + args)
+
+    def get_parameter(self, name, parameter_type, default):
+        self.request("get_parameter", name)
+        return self.parameters.get(name, default)
+
+    get_parameter_bool = get_parameter
+    get_parameter_int = get_parameter
+
+    def purge_video_stream(self):
+        self.request("purge_video_stream")
+
+    def report_parameter(self, name, parameter_type, value):
+        self.request("report_parameter", name, value)
+
+
+class FakeCamera:
+    def __init__(self):
+        self.settings = {}
+        self.set_calls = 0
+        self.grab_times = []
+
+    def grab(self):
+        time.sleep(GRAB_DURATION)
+        self.grab_times.append(time.monotonic())
+        return 0
+
+    def get_camera_settings(self, setting):
+        return self.settings.get(setting, 0)
+
+    def set_camera_settings(self, setting, value):
+        self.set_calls += 1
+        self.settings[setting] = value
+
+
+def load_main(monkeypatch, client):
+    sl = types.ModuleType("pyzed.sl")
+    sl.VIDEO_SETTINGS = VIDEO_SETTINGS
+    sl.Camera = FakeCamera
+    sl.InitParameters = types.SimpleNamespace
+    hub = types.ModuleType("pyzed.sl_hub")
+    hub.HubClient = client
+    hub.PARAMETER_TYPE = types.SimpleNamespace(APPLICATION=0)
+    hub.FunctionEvent = object
+    pyzed = types.ModuleType("pyzed")
+    pyzed.sl = sl
+    pyzed.sl_hub = hub
+    for name, module in (("pyzed", pyzed), ("pyzed.sl", sl), ("pyzed.sl_hub", hub)):
+        monkeypatch.setitem(sys.modules, name, module)
+    spec = importlib.util.spec_from_file_location("camera_viewer_main", os.path.join(os.path.dirname(__file__), "main.py"))
+    main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(main)
+    return main
+
+
+@pytest.fixture
+def client():
+    return FakeHubClient()
+
+
+@pytest.fixture
+def main(monkeypatch, client):
+    return load_main(monkeypatch, client)
+
+
+# Same steps as the main loop of main.py
+def grab_loop(main, camera, frames):
+    for _ in range(frames):
+        if not main.pending_changes.empty():
+            main.apply_pending_changes()
+        if main.settings_batcher.is_due():
+            main.settings_batcher.flush()
+        camera.grab()
+
+
+def wait_for_reports(client, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len([call for call in client.calls if call[0] == "report_parameter"]) >= count:
+            return
+        time.sleep(0.01)
+
+
+def test_grab_does_not_wait_on_hub_during_a_storm_of_updates(main, client):
+    camera = FakeCamera()
+    main.zed = camera
+    main.settings_batcher = main.SettingsBatcher(camera, client)
+    callbacks = [main.on_gain_update, main.on_exposure_update, main.on_gamma_update, main.on_autoexposure_update]
+
+    # A user dragging sliders : every callback fires again and again while the camera streams
+    def storm():
+        for i in range(20):
+            client.parameters["camera_gain"] = i
+            client.parameters["camera_exposure"] = 100 - i
+            callbacks[i % len(callbacks)](None)
+
+    storm_threads = [threading.Thread(target=storm, name="callback") for _ in range(2)]
+    for thread in storm_threads:
+        thread.start()
+    grab_loop(main, camera, 150)
+    storm_grabs = list(camera.grab_times)
+    for thread in storm_threads:
+        thread.join()
+    last_updates = threading.Thread(target=lambda: (main.on_gain_update(None), main.on_exposure_update(None)), name="callback")
+    last_updates.start()
+    last_updates.join()
+    # Last changes, applied once the window is over
+    grab_loop(main, camera, 40)
+    wait_for_reports(client, 2)
+
+    gaps = [b - a for a, b in zip(storm_grabs, storm_grabs[1:])]
+    # A single ZED Hub request on the grab thread would delay a frame by HUB_LATENCY
+    assert max(gaps) < GRAB_DURATION + HUB_LATENCY / 2
+    assert all(call[1] != threading.current_thread().name for call in client.calls)
+    assert camera.settings[VIDEO_SETTINGS.GAIN] == 19
+    assert camera.settings[VIDEO_SETTINGS.EXPOSURE] == 81
+    # One purge per window, not one per update
+    purges = len([call for call in client.calls if call[0] == "purge_video_stream"])
+    assert 0 < purges < 42 / 4
+
+
+def test_callbacks_queue_the_value_read_on_hub(main, client):
+    camera = FakeCamera()
+    main.zed = camera
+    main.video_settings_values[VIDEO_SETTINGS.GAMMA] = 5
+    main.on_gamma_update(None)
+    client.parameters["camera_gain"] = 7
+    main.on_gain_update(None)
+    # The default value of a parameter is the last one applied to the camera
+    assert main.pending_changes.get_nowait() == (VIDEO_SETTINGS.GAMMA, 5)
+    assert main.pending_changes.get_nowait() == (VIDEO_SETTINGS.GAIN, 7)
+    assert camera.settings == {}
+
+
+def test_a_burst_of_changes_is_applied_and_reported_once(main, client):
+    client.latency = 0.0
+    camera = FakeCamera()
+    batcher = main.SettingsBatcher(camera, client, window=0.2)
+    for value in range(10):
+        batcher.add(VIDEO_SETTINGS.GAIN, value)
+        batcher.add(VIDEO_SETTINGS.EXPOSURE, 50 + value)
+        batcher.add(VIDEO_SETTINGS.LED_STATUS, value % 2 == 0)
+    assert not batcher.is_due()
+    time.sleep(0.2)
+    assert batcher.is_due()
+    batcher.flush()
+    assert not batcher.is_due()
+    wait_for_reports(client, 3)
+
+    # One camera call per setting with its latest value, one purge for the whole window, one report per parameter
+    assert camera.set_calls == 3
+    assert camera.settings == {VIDEO_SETTINGS.GAIN: 9, VIDEO_SETTINGS.EXPOSURE: 59, VIDEO_SETTINGS.LED_STATUS: False}
+    calls = [call[:1] + call[2:] for call in client.calls]
+    assert calls.count(("purge_video_stream",)) == 1
+    assert sorted(call for call in calls if call[0] == "report_parameter") == [
+        ("report_parameter", "camera_exposure", 59), ("report_parameter", "camera_gain", 9), ("report_parameter", "led_status", False)]
+
+
+def test_led_status_alone_does_not_purge_the_stream(main, client):
+    client.latency = 0.0
+    batcher = main.SettingsBatcher(FakeCamera(), client, window=0.0)
+    batcher.add(VIDEO_SETTINGS.LED_STATUS, True)
+    batcher.flush()
+    wait_for_reports(client, 1)
+    assert [call[0] for call in client.calls] == ["report_parameter"]
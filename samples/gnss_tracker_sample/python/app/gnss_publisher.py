@@ -0,0 +1,149 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import pyzed.sl_hub as hub
+import math
+import random
+import threading
+import time
+from collections import namedtuple
+
+# A GNSS fix, timestamp in milliseconds
+GnssFix = namedtuple("GnssFix", ["timestamp", "latitude", "longitude", "altitude"])
+
+EARTH_RADIUS = 6371000.0  # in meters
+
+# Maximum number of fixes sent in a single peer message
+MAX_BATCH_SIZE = 50
+
+# Peer messages are built from templates instead of nested dicts and json.dumps
+MESSAGE_TEMPLATE = '{"layer_type": "geolocation", "label": "GNSS_data", "position": %s}'
+BATCH_MESSAGE_TEMPLATE = '{"layer_type": "geolocation", "label": "GNSS_data", "position": %s, "positions": [%s]}'
+POSITION_TEMPLATE = '{"latitude": %.9f, "longitude": %.9f, "altitude": %.4f}'
+TIMED_POSITION_TEMPLATE = '{"timestamp": %d, "latitude": %.9f, "longitude": %.9f, "altitude": %.4f}'
+
+
+#
+# \brief Random walk around a starting position, standing in for a GNSS receiver
+#
+class SimulatedGnssSource:
+    def __init__(self, latitude=48.818737, longitude=2.318206, altitude=0.0):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+
+    def read(self):
+        self.latitude += random.random() / 10000 - .00005
+        self.latitude = min(90.0, self.latitude)
+        self.latitude = max(-90.0, self.latitude)
+        self.longitude += random.random() / 10000 - .00005
+        self.longitude = min(180.0, self.longitude)
+        self.longitude = max(-180.0, self.longitude)
+        self.altitude += random.random() / 10000 - .00005
+        return GnssFix(int(time.time() * 1000), self.latitude, self.longitude, self.altitude)
+
+
+#
+# \brief Horizontal distance between two fixes in meters (equirectangular approximation, fine for close fixes)
+#
+def distance(fix_a, fix_b):
+    lat_a = math.radians(fix_a.latitude)
+    lat_b = math.radians(fix_b.latitude)
+    x = math.radians(fix_b.longitude - fix_a.longitude) * math.cos((lat_a + lat_b) / 2)
+    y = lat_b - lat_a
+    return EARTH_RADIUS * math.hypot(x, y)
+
+
+#
+# \brief Peer message of one or several fixes. A single fix keeps the original message format,
+# several fixes also carry all of them in "positions" while "position" is the latest one.
+#
+def serialize(fixes):
+    last = fixes[-1]
+    position = POSITION_TEMPLATE % (last.latitude, last.longitude, last.altitude)
+    if len(fixes) == 1:
+        return MESSAGE_TEMPLATE % position
+    positions = ", ".join([TIMED_POSITION_TEMPLATE % fix for fix in fixes])
+    return BATCH_MESSAGE_TEMPLATE % (position, positions)
+
+
+#
+# \brief Reads the GNSS source and sends the fixes to the peers from its own thread, independently of the camera.
+# The source is read `fixRate` times per second and the fixes are sent every `dataFreq` seconds, all the fixes
+# of the period in a single message. A fix closer than `minFixDistance` meters to the last one kept is dropped,
+# but a period without any fix kept still sends the latest fix read, so a stationary receiver keeps publishing.
+#
+class GnssPublisher:
+    # parameters : store with the "fixRate", "dataFreq" and "minFixDistance" values
+    # send : function(message) sending a peer message
+    # on_fix : optional function(fix) called with every fix read, before duplicates are dropped
+    def __init__(self, source, parameters, send=None, on_fix=None):
+        self.source = source
+        self.parameters = parameters
+        self.send = send if send is not None else lambda message: hub.HubClient.send_data_to_peers("geolocation", message)
+        self.on_fix = on_fix
+        self.pending = []
+        self.last_fix = None
+        self.latest_fix = None
+        self.sent_messages = 0
+        self.dropped_fixes = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def add_fix(self, fix, min_distance):
+        self.latest_fix = fix
+        if self.last_fix is not None and distance(self.last_fix, fix) < min_distance:
+            self.dropped_fixes += 1
+            return
+        self.last_fix = fix
+        self.pending.append(fix)
+
+    def publish(self):
+        if len(self.pending) == 0 and self.latest_fix is not None:
+            # Keepalive : nothing moved during the period, the position is sent again
+            self.pending.append(self.latest_fix)
+        while len(self.pending) > 0:
+            self.send(serialize(self.pending[:MAX_BATCH_SIZE]))
+            self.pending = self.pending[MAX_BATCH_SIZE:]
+            self.sent_messages += 1
+
+    def run(self):
+        next_fix = next_publish = time.monotonic()
+        while not self.stopped.is_set():
+            params = self.parameters.snapshot()
+            now = time.monotonic()
+            if now >= next_fix:
+                fix = self.source.read()
+                if self.on_fix is not None:
+                    self.on_fix(fix)
+                self.add_fix(fix, params["minFixDistance"])
+                # Skip the ticks missed instead of bursting to catch up
+                next_fix = max(next_fix + 1.0 / max(params["fixRate"], 0.01), now)
+            if now >= next_publish:
+                self.publish()
+                next_publish = max(next_publish + params["dataFreq"], now)
+            self.stopped.wait(max(0.0, min(next_fix, next_publish) - time.monotonic()))
@@ -20,41 +20,57 @@
 
 import pyzed.sl as sl
 import pyzed.sl_hub as hub
-import json
 import os
-import random
+import time
+from gnss_publisher import GnssPublisher, SimulatedGnssSource
+from parameter_store import ParameterStore
+from waypoints import GeofenceEngine
 
-# Constants, defined as global variables
-latitude = 48.818737
-longitude = 2.318206
-altitude = 0
+# Application parameters and their type, defaults are read from parameters.json
+parameters = ParameterStore({
+    "dataFreq": float,  # in seconds
+    "fixRate": float,  # in Hz
+    "minFixDistance": float,  # in meters
+})
 
-# Parameters, defined as global variables
-dataFreq = 1.0
+def on_data_freq_update(changed):
+    print("GNSS parameters updated :", changed)
 
-def on_date_freq_update(message_received):
-    global dataFreq
-    print("Data frequency updated")
-    dataFreq = hub.HubClient.get_parameter_float(
-        "dataFreq", hub.PARAMETER_TYPE.APPLICATION, dataFreq)
 
+# Geofences of the waypoints, every GNSS fix is evaluated against them
+geofence = GeofenceEngine()
+last_distance_telemetry = 0.0
 
 def on_waypoints(message_received):
-    # Get the waypoints from the device parameters
+    # Get the waypoints from the device parameters, they are indexed once per update
     waypoints = hub.HubClient.get_parameter_string(
         "waypoints", hub.PARAMETER_TYPE.DEVICE, "[]")
-    print("waypoints", waypoints)
+    try:
+        nb_waypoints = geofence.update_waypoints(waypoints)
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        hub.HubClient.send_log("Invalid waypoints : " + str(e), hub.LOG_LEVEL.ERROR)
+        return
+    print(nb_waypoints, "waypoints loaded")
 
 
-def main():
-    global dataFreq
-    global latitude
-    global longitude
-    global altitude
+def on_gnss_fix(fix):
+    global last_distance_telemetry
 
-    hub.HubClient.load_application_parameters("parameters.json")
+    events, distance_to_next = geofence.evaluate(fix)
+    for event, waypoint in events:
+        hub.HubClient.send_telemetry("waypoint_event", {"event": event, "waypoint": waypoint.index,
+                                                         "latitude": fix.latitude, "longitude": fix.longitude})
+
+    # Distance to the next waypoint, sent at the data frequency
+    now = time.monotonic()
+    if distance_to_next is not None and now >= last_distance_telemetry + parameters.get("dataFreq"):
+        hub.HubClient.send_telemetry("waypoint_distance", {"next_waypoint": geofence.next_waypoint, "distance": distance_to_next})
+        last_distance_telemetry = now
 
-    dataFreq = 1.0  # in seconds
+
+def main():
+    hub.HubClient.load_application_parameters("parameters.json")
+    parameters.load_defaults()
 
     # Create camera object
     zed = sl.Camera()
@@ -98,54 +114,30 @@ def main():
     # PARAMETER_TYPE.APPLICATION is only suitable for dockerized apps, like this sample.
     # If you want to test this on your machine, you'd better switch all your subscriptions to PARAMETER_TYPE.DEVICE.
 
-    callback_params = hub.CallbackParameters()
-    callback_params.set_parameter_callback("onDataFreqUpdate", "dataFreq",  hub.CALLBACK_TYPE.ON_PARAMETER_UPDATE,  hub.PARAMETER_TYPE.APPLICATION)
-    hub.HubClient.register_function(on_date_freq_update, callback_params)
+    parameters.register_callback("onDataFreqUpdate", ["dataFreq", "fixRate", "minFixDistance"], on_data_freq_update)
 
+    callback_params = hub.CallbackParameters()
     callback_params.set_parameter_callback("onWaypoints", "waypoints",  hub.CALLBACK_TYPE.ON_PARAMETER_UPDATE,  hub.PARAMETER_TYPE.DEVICE)
     hub.HubClient.register_function(on_waypoints, callback_params)
 
     # get values defined by the ZED Hub interface.
+    parameters.refresh()
+    on_waypoints(None)
 
-    dataFreq = hub.HubClient.get_parameter_float(
-        "dataFreq", hub.PARAMETER_TYPE.APPLICATION, dataFreq)
-
-    prev_timestamp = zed.get_timestamp(sl.TIME_REFERENCE.CURRENT)
+    # /*******     Define and send data   *********/
+    # GNSS fixes (here a simulated random walk) are sent to the peers from their own thread, on their own timer
+    gnss_publisher = GnssPublisher(SimulatedGnssSource(), parameters, on_fix=on_gnss_fix)
+    gnss_publisher.start()
 
     # Main loop
     while True:
         status_zed = zed.grab(runtime_params)
         if status_zed == sl.ERROR_CODE.SUCCESS:
-
-            current_ts = zed.get_timestamp(sl.TIME_REFERENCE.IMAGE)
-
-            # /*******     Define and send data   *********/
-            
-            if current_ts.get_seconds() >= prev_timestamp.get_seconds() + dataFreq:
-                # Update coordinate
-                latitude += random.random() / 10000 - .00005
-                latitude = min(90.0, latitude)
-                latitude = max(-90.0, latitude)
-                longitude += random.random() / 10000 - .00005
-                longitude = min(180.0, longitude)
-                longitude = max(-180.0, longitude)
-                altitude += random.random() / 10000 - .00005
-
-                # Send data
-                gnss = {}
-                gnss["layer_type"] = "geolocation"
-                gnss["label"] = "GNSS_data"
-                gnss["position"] = {}
-                gnss["position"]["latitude"] = latitude
-                gnss["position"]["longitude"] = longitude
-                gnss["position"]["altitude"] = altitude
-
-                hub.HubClient.send_data_to_peers("geolocation", json.dumps(gnss))
-                prev_timestamp = current_ts
-
             # Always update Hub at the end of the grab loop
             hub.HubClient.update()
         
+    gnss_publisher.stop()
+
     if zed.is_opened():
         zed.close()
 
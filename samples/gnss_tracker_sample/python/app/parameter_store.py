@@ -0,0 +1,131 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import pyzed.sl_hub as hub
+import json
+import os
+import threading
+from types import MappingProxyType
+
+# Hub getter of each parameter type
+GETTERS = {
+    bool: "get_parameter_bool",
+    int: "get_parameter_int",
+    float: "get_parameter_float",
+    str: "get_parameter_string",
+}
+
+# Relative default files are read from the directory of this module, whatever the working directory
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+#
+# \brief Convert a value read from a file or from ZED Hub to `value_type`.
+# bool("false") is True, so booleans written as strings are parsed explicitly.
+#
+def parse_value(value_type, value):
+    if value_type is bool and isinstance(value, str):
+        text = value.strip().lower()
+        if text in ("true", "1", "yes", "on"):
+            return True
+        if text in ("false", "0", "no", "off", ""):
+            return False
+        raise ValueError("Invalid boolean value: " + value)
+    return value_type(value)
+
+#
+# \brief Typed application parameters, fetched from ZED Hub once and cached.
+# Defaults come from parameters.json and app.json, values are refreshed only for the keys of a callback.
+# Reads go to an immutable snapshot that a refresh replaces as a whole, so the main loop reads without lock.
+#
+class ParameterStore:
+    # types : name -> bool, int, float or str
+    # client : hub.HubClient, or a stand-in with the same get_parameter_* and register_function methods
+    def __init__(self, types, parameter_type=hub.PARAMETER_TYPE.APPLICATION, client=hub.HubClient):
+        self.types = dict(types)
+        self.parameter_type = parameter_type
+        self.client = client
+        self.refresh_lock = threading.Lock()
+        self.values = MappingProxyType({name: value_type() for name, value_type in self.types.items()})
+
+    #
+    # \brief Read the default values from parameters.json (flat) and app.json (release default parameters).
+    # Relative paths are relative to the directory of this module. Files that do not exist are skipped, the last file wins.
+    #
+    def load_defaults(self, files=("../app.json", "parameters.json")):
+        values = dict(self.values)
+        for path in files:
+            path = os.path.join(DIRECTORY, path)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                content = json.load(f)
+            if "release" in content:
+                content = content["release"].get("default_parameters", {}).get("requested", {})
+            for name, value_type in self.types.items():
+                if name in content:
+                    values[name] = parse_value(value_type, content[name])
+        self.values = MappingProxyType(values)
+
+    #
+    # \brief Fetch the values of `names` (all the parameters if None) from ZED Hub, the cached value is the default.
+    # \return the names of the parameters whose value changed
+    #
+    def refresh(self, names=None):
+        if names is None:
+            names = self.types.keys()
+        with self.refresh_lock:
+            values = dict(self.values)
+            changed = []
+            for name in names:
+                value_type = self.types[name]
+                getter = getattr(self.client, GETTERS[value_type])
+                value = parse_value(value_type, getter(name, self.parameter_type, values[name]))
+                if value != values[name]:
+                    values[name] = value
+                    changed.append(name)
+            self.values = MappingProxyType(values)
+        return changed
+
+    #
+    # \brief Read-only view of all the values, consistent across parameters
+    #
+    def snapshot(self):
+        return self.values
+
+    def get(self, name):
+        return self.values[name]
+
+    #
+    # \brief Register a callback refreshing only `names` when one of them is updated on ZED Hub.
+    # on_change(changed_names) is called afterwards if at least one value changed.
+    #
+    def register_callback(self, callback_name, names, on_change=None):
+        names = list(names)
+
+        def callback(message_received):
+            changed = self.refresh(names)
+            if on_change is not None and len(changed) > 0:
+                on_change(changed)
+            return True
+
+        callback_params = hub.CallbackParameters()
+        callback_params.set_parameter_callback(callback_name, "|".join(names), hub.CALLBACK_TYPE.ON_PARAMETER_UPDATE, self.parameter_type)
+        self.client.register_function(callback, callback_params)
+        return callback
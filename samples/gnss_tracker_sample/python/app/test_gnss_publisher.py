@@ -0,0 +1,154 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_gnss_publisher.py
+# The ZED SDK is not needed : gnss_publisher.py is loaded with a fake pyzed, messages go to an injected send function.
+
+import importlib.util
+import json
+import math
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+# Moves north by `step` meters on every read, stays in place with step = 0
+class SimulatedSource:
+    def __init__(self, step=0.0, latitude=48.818737, longitude=2.318206):
+        self.step = step
+        self.latitude = latitude
+        self.longitude = longitude
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        self.latitude += math.degrees(self.step / 6371000.0)
+        return gnss_publisher.GnssFix(self.reads, self.latitude, self.longitude, 0.0)
+
+
+class FakeParameters:
+    def __init__(self, values):
+        self.values = values
+
+    def snapshot(self):
+        return self.values
+
+
+# Messages are decoded as they are sent, as a peer would read them
+class Sent:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = []
+
+    def __call__(self, message):
+        with self.lock:
+            self.messages.append(json.loads(message))
+
+    def positions(self, message):
+        return message.get("positions", [message["position"]])
+
+
+gnss_publisher = None
+
+
+@pytest.fixture(autouse=True)
+def module(monkeypatch):
+    global gnss_publisher
+    hub = types.ModuleType("pyzed.sl_hub")
+    hub.HubClient = None
+    pyzed = types.ModuleType("pyzed")
+    pyzed.sl_hub = hub
+    monkeypatch.setitem(sys.modules, "pyzed", pyzed)
+    monkeypatch.setitem(sys.modules, "pyzed.sl_hub", hub)
+    spec = importlib.util.spec_from_file_location("gnss_tracker_publisher", os.path.join(os.path.dirname(__file__), "gnss_publisher.py"))
+    gnss_publisher = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gnss_publisher)
+    return gnss_publisher
+
+
+def test_fixes_of_a_period_are_sent_in_one_message():
+    sent = Sent()
+    source = SimulatedSource(step=10.0)
+    publisher = gnss_publisher.GnssPublisher(source, FakeParameters({"fixRate": 100.0, "dataFreq": 0.2, "minFixDistance": 0.0}), sent)
+    publisher.start()
+    time.sleep(0.7)
+    publisher.stop()
+    publisher.publish()
+    # Every fix read is sent once, in far fewer messages than fixes
+    positions = [position for message in sent.messages for position in sent.positions(message)]
+    assert len(positions) == source.reads
+    latitudes = [position["latitude"] for position in positions]
+    assert latitudes == sorted(latitudes)
+    assert len(sent.messages) <= 6
+    assert max(len(sent.positions(message)) for message in sent.messages) > 5
+    # "position" is the latest fix of the message
+    for message in sent.messages:
+        assert message["position"]["latitude"] == sent.positions(message)[-1]["latitude"]
+
+
+def test_fixes_closer_than_min_distance_are_dropped():
+    sent = Sent()
+    source = SimulatedSource(step=1.0)
+    publisher = gnss_publisher.GnssPublisher(source, None, sent)
+    for _ in range(20):
+        publisher.add_fix(source.read(), 4.5)
+    publisher.publish()
+    # A fix is kept every 5 m, the 4 in between are dropped
+    assert [position["timestamp"] for position in sent.positions(sent.messages[0])] == [1, 6, 11, 16]
+    assert publisher.dropped_fixes == 16
+
+
+def test_static_source_keeps_publishing_its_latest_fix():
+    sent = Sent()
+    source = SimulatedSource(step=0.0)
+    publisher = gnss_publisher.GnssPublisher(source, None, sent)
+    for period in range(3):
+        for _ in range(10):
+            publisher.add_fix(source.read(), 1.0)
+        publisher.publish()
+    assert len(sent.messages) == 3
+    # Single fix messages keep the original format
+    assert all("positions" not in message for message in sent.messages)
+    assert sent.messages[2]["position"]["latitude"] == pytest.approx(source.latitude)
+    assert publisher.dropped_fixes == 29
+
+
+def test_nothing_is_sent_before_the_first_fix():
+    sent = Sent()
+    publisher = gnss_publisher.GnssPublisher(SimulatedSource(), None, sent)
+    publisher.publish()
+    assert sent.messages == []
+
+
+def test_large_batches_are_split():
+    sent = Sent()
+    source = SimulatedSource(step=10.0)
+    publisher = gnss_publisher.GnssPublisher(source, None, sent)
+    for _ in range(2 * gnss_publisher.MAX_BATCH_SIZE + 20):
+        publisher.add_fix(source.read(), 0.0)
+    publisher.publish()
+    assert [len(sent.positions(message)) for message in sent.messages] == [gnss_publisher.MAX_BATCH_SIZE, gnss_publisher.MAX_BATCH_SIZE, 20]
+    timestamps = [position["timestamp"] for message in sent.messages for position in sent.positions(message)]
+    assert timestamps == list(range(1, 2 * gnss_publisher.MAX_BATCH_SIZE + 21))
+    assert publisher.sent_messages == 3
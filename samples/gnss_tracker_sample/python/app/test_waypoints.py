@@ -0,0 +1,69 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_waypoints.py
+
+import random
+
+import pytest
+
+from waypoints import Waypoint, WaypointIndex
+
+
+def make_route(count, radii, seed=0):
+    rng = random.Random(seed)
+    latitude, longitude = 48.818737, 2.318206
+    waypoints = []
+    for i in range(count):
+        latitude += rng.uniform(-1, 1) * 0.0005
+        longitude += rng.uniform(-1, 1) * 0.0005
+        waypoints.append(Waypoint(i, latitude, longitude, rng.choice(radii)))
+    return waypoints
+
+
+def check_against_every_waypoint(index, waypoints, seed=1):
+    rng = random.Random(seed)
+    for waypoint in rng.sample(waypoints, 300):
+        latitude = waypoint.latitude + rng.uniform(-1, 1) * 0.0003
+        longitude = waypoint.longitude + rng.uniform(-1, 1) * 0.0003
+        expected = {w.index for w in waypoints if index.distance(w, latitude, longitude) <= w.radius}
+        assert index.containing(latitude, longitude) == expected
+
+
+@pytest.mark.parametrize("cell_size", [None, 3.0, 100.0])
+def test_lookup_finds_every_containing_geofence(cell_size):
+    waypoints = make_route(2000, [5.0, 10.0, 20.0, 60.0])
+    index = WaypointIndex(waypoints, cell_size)
+    check_against_every_waypoint(index, waypoints)
+
+
+def test_large_geofence_does_not_grow_the_cells():
+    waypoints = make_route(2000, [10.0])
+    waypoints[100] = waypoints[100]._replace(radius=50000.0)
+    index = WaypointIndex(waypoints)
+    assert index.cell_size == 10.0
+    assert index.large == [waypoints[100]]
+    # Every small geofence is found in a handful of cells
+    assert max(len(cell) for cell in index.grid.values()) < 20
+    check_against_every_waypoint(index, waypoints)
+
+
+def test_empty_route():
+    assert WaypointIndex([]).containing(48.8, 2.3) == set()
@@ -0,0 +1,147 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import json
+import math
+import threading
+from collections import namedtuple
+
+EARTH_RADIUS = 6371000.0  # in meters
+
+# A waypoint of the route and the radius of its geofence, in meters
+Waypoint = namedtuple("Waypoint", ["index", "latitude", "longitude", "radius"])
+
+
+#
+# \brief Parse the "waypoints" parameter : a JSON list of {"latitude", "longitude"(, "radius")} objects
+# or of [latitude, longitude] pairs, in route order
+#
+def parse_waypoints(text, default_radius):
+    waypoints = []
+    for item in json.loads(text):
+        if isinstance(item, dict):
+            latitude = item.get("latitude", item.get("lat"))
+            longitude = item.get("longitude", item.get("lng", item.get("lon")))
+            radius = item.get("radius", default_radius)
+        else:
+            latitude, longitude = item[0], item[1]
+            radius = default_radius
+        waypoints.append(Waypoint(len(waypoints), float(latitude), float(longitude), float(radius)))
+    return waypoints
+
+
+# A geofence spanning more cells than this on a side is not put in the grid, it is checked on every lookup
+MAX_GEOFENCE_CELLS = 8
+
+
+#
+# \brief Uniform grid over a local plane projection of the waypoints. Each geofence is put in every cell
+# its radius covers, so the geofences containing a position are all in the cell of this position.
+# The cells are as large as the median geofence (or `cell_size` meters), so that a few large geofences
+# do not make every lookup scan most of the route. The largest ones are kept apart and always checked.
+#
+class WaypointIndex:
+    def __init__(self, waypoints, cell_size=None):
+        self.waypoints = waypoints
+        self.grid = {}
+        self.large = []
+        if len(waypoints) == 0:
+            self.origin_latitude = 0.0
+            self.cos_latitude = 1.0
+            self.cell_size = 1.0
+            return
+        self.origin_latitude = sum(waypoint.latitude for waypoint in waypoints) / len(waypoints)
+        self.cos_latitude = math.cos(math.radians(self.origin_latitude))
+        if cell_size is None:
+            radii = sorted(waypoint.radius for waypoint in waypoints)
+            cell_size = radii[len(radii) // 2]
+        self.cell_size = max(1.0, cell_size)
+        for waypoint in waypoints:
+            x, y = self.project(waypoint.latitude, waypoint.longitude)
+            first_x, first_y = math.floor((x - waypoint.radius) / self.cell_size), math.floor((y - waypoint.radius) / self.cell_size)
+            last_x, last_y = math.floor((x + waypoint.radius) / self.cell_size), math.floor((y + waypoint.radius) / self.cell_size)
+            if last_x - first_x >= MAX_GEOFENCE_CELLS or last_y - first_y >= MAX_GEOFENCE_CELLS:
+                self.large.append(waypoint)
+                continue
+            for cell_x in range(first_x, last_x + 1):
+                for cell_y in range(first_y, last_y + 1):
+                    self.grid.setdefault((cell_x, cell_y), []).append(waypoint)
+
+    # Position in meters on the local plane
+    def project(self, latitude, longitude):
+        x = math.radians(longitude) * self.cos_latitude * EARTH_RADIUS
+        y = math.radians(latitude - self.origin_latitude) * EARTH_RADIUS
+        return x, y
+
+    def cell(self, latitude, longitude):
+        x, y = self.project(latitude, longitude)
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def distance(self, waypoint, latitude, longitude):
+        x_a, y_a = self.project(waypoint.latitude, waypoint.longitude)
+        x_b, y_b = self.project(latitude, longitude)
+        return math.hypot(x_b - x_a, y_b - y_a)
+
+    # Indices of the waypoints whose geofence contains the position
+    def containing(self, latitude, longitude):
+        inside = set()
+        for waypoints in (self.grid.get(self.cell(latitude, longitude), ()), self.large):
+            for waypoint in waypoints:
+                if self.distance(waypoint, latitude, longitude) <= waypoint.radius:
+                    inside.add(waypoint.index)
+        return inside
+
+
+#
+# \brief Evaluates each GNSS fix against the waypoints of the route : enter/exit events of their geofences
+# and distance to the next waypoint. The next waypoint is the one after the furthest waypoint reached.
+#
+class GeofenceEngine:
+    def __init__(self, default_radius=10.0):
+        self.default_radius = default_radius
+        self.lock = threading.Lock()
+        self.index = WaypointIndex([])
+        self.inside = set()
+        self.next_waypoint = 0
+
+    # Called when the waypoints are updated, they are parsed and indexed once
+    def update_waypoints(self, text):
+        index = WaypointIndex(parse_waypoints(text, self.default_radius))
+        with self.lock:
+            self.index = index
+            self.inside = set()
+            self.next_waypoint = 0
+        return len(index.waypoints)
+
+    # Returns the list of ("enter" or "exit", waypoint) events and the distance to the next waypoint
+    # in meters, None once the route is over or without waypoints
+    def evaluate(self, fix):
+        with self.lock:
+            index = self.index
+            inside = index.containing(fix.latitude, fix.longitude)
+            events = [("enter", index.waypoints[i]) for i in sorted(inside - self.inside)]
+            events += [("exit", index.waypoints[i]) for i in sorted(self.inside - inside)]
+            self.inside = inside
+            reached = [i for i in inside if i >= self.next_waypoint]
+            if len(reached) > 0:
+                self.next_waypoint = max(reached) + 1
+            if self.next_waypoint >= len(index.waypoints):
+                return events, None
+            return events, index.distance(index.waypoints[self.next_waypoint], fix.latitude, fix.longitude)
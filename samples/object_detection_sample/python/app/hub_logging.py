@@ -0,0 +1,189 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import pyzed.sl_hub as hub
+import logging
+import queue
+import threading
+import time
+
+# ZED Hub level of each Python logging level
+HUB_LEVELS = {
+    logging.DEBUG: hub.LOG_LEVEL.DEBUG,
+    logging.INFO: hub.LOG_LEVEL.INFO,
+    logging.WARNING: hub.LOG_LEVEL.WARNING,
+    logging.ERROR: hub.LOG_LEVEL.ERROR,
+    logging.CRITICAL: hub.LOG_LEVEL.ERROR,
+}
+
+# Messages per second and burst allowed for each message key, by level : errors get more room than debug logs
+DEFAULT_RATES = {
+    logging.DEBUG: (0.2, 2),
+    logging.INFO: (1.0, 5),
+    logging.WARNING: (2.0, 10),
+    logging.ERROR: (5.0, 20),
+}
+
+
+def hub_level(levelno):
+    for python_level in sorted(HUB_LEVELS, reverse=True):
+        if levelno >= python_level:
+            return HUB_LEVELS[python_level]
+    return hub.LOG_LEVEL.DEBUG
+
+
+# Token bucket of a message key, with the number of messages suppressed since the last one sent
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.suppressed = 0
+        self.last_message = ""
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+#
+# \brief logging.Handler sending the records to ZED Hub with send_log from a background thread.
+# Records are rate limited per message key (level and unformatted message, so "Grab failed : %s" is one key
+# whatever its arguments) : a key over its rate is not sent, and the next message sent for it tells how many
+# were suppressed. Suppressed messages are also summarized once the bucket has refilled, so a burst always
+# ends with a count. The queue is bounded, a record that does not fit is dropped and counted.
+# Pending records are sent when the handler is closed, which logging also does at exit.
+#
+class HubLogHandler(logging.Handler):
+    # send : function(message, hub level)
+    def __init__(self, level=logging.NOTSET, rates=DEFAULT_RATES, max_queue=1000, send=None):
+        super().__init__(level)
+        self.rates = rates
+        self.send = send if send is not None else hub.HubClient.send_log
+        self.messages = queue.Queue(maxsize=max_queue)
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def rate(self, levelno):
+        for python_level in sorted(self.rates, reverse=True):
+            if levelno >= python_level:
+                return self.rates[python_level]
+        return self.rates[min(self.rates)]
+
+    def enqueue(self, message, level):
+        try:
+            self.messages.put_nowait((message, level))
+        except queue.Full:
+            # Records are emitted from any thread
+            with self.buckets_lock:
+                self.dropped += 1
+
+    def emit(self, record):
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        key = (record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self.buckets_lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(*self.rate(record.levelno))
+                self.buckets[key] = bucket
+            if not bucket.take(now):
+                bucket.suppressed += 1
+                bucket.last_message = message
+                return
+            if bucket.suppressed > 0:
+                message += " (" + str(bucket.suppressed) + " similar messages suppressed)"
+                bucket.suppressed = 0
+        self.enqueue(message, hub_level(record.levelno))
+
+    # Summary of the keys whose suppressed messages were not reported yet, once they can send again
+    def summarize_suppressed(self, force=False):
+        now = time.monotonic()
+        summaries = []
+        with self.buckets_lock:
+            for (levelno, msg), bucket in self.buckets.items():
+                if bucket.suppressed > 0 and (force or bucket.take(now)):
+                    summaries.append((bucket.last_message + " (repeated " + str(bucket.suppressed) + " times)", hub_level(levelno)))
+                    bucket.suppressed = 0
+        for message, level in summaries:
+            self.enqueue(message, level)
+
+    def run(self):
+        last_summary = time.monotonic()
+        while True:
+            try:
+                item = self.messages.get(timeout=1.0)
+            except queue.Empty:
+                item = ()
+            if time.monotonic() >= last_summary + 1.0:
+                self.summarize_suppressed()
+                last_summary = time.monotonic()
+            if item is None:
+                break
+            if len(item) == 0:
+                continue
+            message, level = item
+            with self.buckets_lock:
+                dropped = self.dropped
+                self.dropped = 0
+            if dropped > 0:
+                message += " (" + str(dropped) + " log messages dropped)"
+            try:
+                self.send(message, level)
+            except Exception:
+                pass
+
+    def flush(self):
+        self.summarize_suppressed(force=True)
+
+    #
+    # \brief Send the pending and suppressed messages, then stop the thread
+    #
+    def close(self):
+        if self.thread.is_alive():
+            self.flush()
+            # Wait for room rather than dropping the stop marker
+            self.messages.put(None)
+            self.thread.join()
+        super().close()
+
+
+#
+# \brief Add a HubLogHandler to `logger` (the root logger by default).
+# Close the handler before disconnecting from ZED Hub so that the pending messages are sent.
+#
+def setup_hub_logging(logger=None, level=logging.INFO):
+    logger = logger if logger is not None else logging.getLogger()
+    handler = HubLogHandler()
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
@@ -21,63 +21,163 @@
 import pyzed.sl as sl
 import pyzed.sl_hub as hub
 import cv2
+import logging
 import numpy as np
 import os
-
-# Parameters, defined as global variables
-draw_bboxes = False
-recordVideoEvent = True
-nbFramesNoDetBtw2Events = 30
-recordTelemetry = True
-telemetryFreq = 10.0
-
-def on_display_parameters_update(message_received):
-    global draw_bboxes
-    print("Display parameter updated")
-    draw_bboxes = hub.HubClient.get_parameter_bool(
-        "draw_bboxes", hub.PARAMETER_TYPE.APPLICATION)
-    hub.HubClient.send_log(
-        "New parameter : draw_bboxes modified to " + str(draw_bboxes), hub.LOG_LEVEL.INFO)
-    return True
-
-
-def on_video_event_update(message_received):
-    global recordVideoEvent
-    global nbFramesNoDetBtw2Events
-    print("Video event updated")
-    recordVideoEvent = hub.HubClient.get_parameter_bool(
-        "recordVideoEvent", hub.PARAMETER_TYPE.APPLICATION, recordVideoEvent)
-    nbFramesNoDetBtw2Events = hub.HubClient.get_parameter_int(
-        "nbFramesNoDetBtw2Events", hub.PARAMETER_TYPE.APPLICATION, nbFramesNoDetBtw2Events)
-    hub.HubClient.send_log(
-        "New parameters : recordVideoEvent or nbFramesNoDetBtw2Events modified", hub.LOG_LEVEL.INFO)
-
-
-def on_telemetry_update(message_received):
-    global recordTelemetry
-    global telemetryFreq
-    print("Telemetry updated")
-    recordTelemetry = hub.HubClient.get_parameter_bool(
-        "recordTelemetry", hub.PARAMETER_TYPE.APPLICATION, recordTelemetry)
-    telemetryFreq = hub.HubClient.get_parameter_float(
-        "telemetryFreq", hub.PARAMETER_TYPE.APPLICATION, telemetryFreq)
-    hub.HubClient.send_log(
-        "New parameters : recordTelemetry or telemetryFreq modified", hub.LOG_LEVEL.INFO)
+import queue
+import threading
+import time
+from hub_logging import setup_hub_logging
+from parameter_store import ParameterStore
+from telemetry_client import TelemetryClient
+from video_event import VideoEventSegmenter, send_video_event, START
+
+# Application parameters and their type, defaults are read from parameters.json
+parameters = ParameterStore({
+    "draw_bboxes": bool,
+    "recordVideoEvent": bool,
+    "nbFramesNoDetBtw2Events": int,  # number of frame
+    "recordTelemetry": bool,
+    "telemetryFreq": float,  # in seconds
+    "pipelinedRendering": bool,
+})
+
+logger = logging.getLogger("object_app")
+
+# Detections of a frame. Only the tracking states are read on every frame, positions and boxes are
+# gathered into numpy arrays in a single pass when the telemetry or the drawing needs them
+class DetectionSummary:
+    def __init__(self, objects):
+        self.object_list = objects.object_list
+        self.count = len(self.object_list)
+        self.tracking_ok = [obj.tracking_state == sl.OBJECT_TRACKING_STATE.OK for obj in self.object_list]
+        self.reliable_count = sum(self.tracking_ok)
+
+    # Mean distance of the objects from the camera
+    def mean_distance(self):
+        if self.count == 0:
+            return 0.0
+        positions = np.array([obj.position for obj in self.object_list], dtype=np.float32)
+        return float(np.linalg.norm(positions, axis=1).mean())
+
+    # 2D boxes of the tracked objects, scaled to the image size, as int32 polygons for cv2.polylines
+    def reliable_boxes(self, ratio_x, ratio_y):
+        boxes = np.array([obj.bounding_box_2d for obj, ok in zip(self.object_list, self.tracking_ok)
+                          if ok and len(obj.bounding_box_2d) == 4], dtype=np.float32).reshape(-1, 4, 2)
+        return (boxes * np.array([ratio_x, ratio_y], dtype=np.float32)).astype(np.int32)
+
+
+# Time spent in each stage of the grab loop and of the render worker, averaged over a report period
+class StageTimings:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    # Mean duration of each stage in ms since the last report, and reset
+    def report(self):
+        with self.lock:
+            means = {stage: round(1000 * self.totals[stage] / self.counts[stage], 2) for stage in self.totals}
+            self.totals = {}
+            self.counts = {}
+        return means
+
+
+# A preallocated sl.Mat and the numpy array sharing its memory (get_data with deep_copy = False)
+class FrameBuffer:
+    def __init__(self, width, height):
+        self.mat = sl.Mat(width, height, sl.MAT_TYPE.U8_C4)
+        self.data = self.mat.get_data(sl.MEM.CPU, False)
+
+
+# Ring of frame buffers, so that capture writes frame N+1 while frame N is still being drawn or uploaded, without copy.
+# A buffer has a single owner at a time : acquire() hands a free buffer to the capture thread,
+# which passes it on to the consumer, which gives it back with release() once the frame is uploaded.
+class FramePool:
+    def __init__(self, size=2, width=1280, height=720):
+        self.free = queue.Queue()
+        for _ in range(size):
+            self.free.put(FrameBuffer(width, height))
+
+    # Blocks until a buffer is released if they are all in use
+    def acquire(self):
+        return self.free.get()
+
+    def release(self, buffer):
+        self.free.put(buffer)
+
+
+# Draws the bboxes from its own thread, so that zed.grab() does not wait on it.
+# The camera and ZED Hub are only used from the grab thread : a frame submitted after grab N is drawn while
+# the grab thread goes on with grab N+1, which collects it and uploads it with hub.HubClient.update().
+# No frame is dropped, drawing only has to be faster than a grab. The pool holds the frame being uploaded
+# and the one being drawn.
+class RenderWorker:
+    def __init__(self, timings):
+        self.timings = timings
+        self.pool = FramePool(2)
+        self.frames = queue.Queue()
+        self.drawn = queue.Queue()
+        self.pending = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Buffer for the next frame, to be given back with submit()
+    def acquire(self):
+        return self.pool.acquire()
+
+    def release(self, buffer):
+        self.pool.release(buffer)
+
+    # boxes are already scaled to the buffer image
+    def submit(self, buffer, boxes):
+        self.pending += 1
+        self.frames.put((buffer, boxes))
+
+    # Frame submitted on the previous grab, once drawn, to be given back with release() once uploaded.
+    # None if no frame is pending
+    def collect(self):
+        if self.pending == 0:
+            return None
+        start = time.perf_counter()
+        buffer = self.drawn.get()
+        self.pending -= 1
+        self.timings.add("wait_draw", time.perf_counter() - start)
+        return buffer
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            buffer, boxes = item
+            start = time.perf_counter()
+            if len(boxes) > 0:
+                cv2.polylines(buffer.data, list(boxes), True, (50, 200, 50), 4)
+            self.timings.add("draw", time.perf_counter() - start)
+            self.drawn.put(buffer)
+
+    def stop(self):
+        buffer = self.collect()
+        if buffer is not None:
+            self.release(buffer)
+        self.frames.put(None)
+        self.thread.join()
+
+
+def on_parameters_update(changed):
+    print("Parameters updated :", changed)
+    logger.info("New parameters : " + ", ".join(name + " modified to " + str(parameters.get(name)) for name in changed))
 
 
 def main():
-    global draw_bboxes
-    global nbFramesNoDetBtw2Events
-    global nbFramesNoDetBtw2Events
-    global recordTelemetry
-    global telemetryFreq
-
     hub.HubClient.load_application_parameters("parameters.json")
-
-    recordVideoEvent = True
-    nbFramesNoDetBtw2Events = 30  # number of frame
-    recordTelemetry = True
-    telemetryFreq = 10.0  # in seconds
+    parameters.load_defaults()
 
     # Create camera object
     zed = sl.Camera()
@@ -88,6 +188,9 @@ def main():
         print("Initialization error ", status_hub)
         exit(1)
 
+    # Logs are sent to ZED Hub from a background thread, rate limited per message
+    log_handler = setup_hub_logging(logger, logging.DEBUG)
+
     # Load application parameter file in development mode
     application_token = os.getenv("SL_APPLICATION_TOKEN")
     if application_token == None:
@@ -107,8 +210,7 @@ def main():
     status_zed = zed.open(init_params)
 
     if status_zed != sl.ERROR_CODE.SUCCESS:
-        hub.HubClient.send_log(
-            "Camera initialization error : " + str(status_zed), hub.LOG_LEVEL.ERROR)
+        logger.error("Camera initialization error : %s", status_zed)
         exit(1)
 
     # Register the camera once it's open
@@ -123,8 +225,7 @@ def main():
     track_params.set_as_static = False
     status_zed = zed.enable_positional_tracking(track_params)
     if status_zed != sl.ERROR_CODE.SUCCESS:
-        hub.HubClient.send_log(
-            "Positional tracking initialization error : " + str(status_zed), hub.LOG_LEVEL.ERROR)
+        logger.error("Positional tracking initialization error : %s", status_zed)
         exit(1)
 
     # Enable the Objects detection module
@@ -132,8 +233,7 @@ def main():
     object_detection_params.image_sync = True
     status_zed = zed.enable_object_detection(object_detection_params)
     if status_zed != sl.ERROR_CODE.SUCCESS:
-        hub.HubClient.send_log(
-            "Object detection initialization error : " + str(status_zed), hub.LOG_LEVEL.ERROR)
+        logger.error("Object detection initialization error : %s", status_zed)
         exit(1)
 
     # Setup callback for parameters
@@ -151,48 +251,46 @@ def main():
     # PARAMETER_TYPE.APPLICATION is only suitable for dockerized apps, like this sample.
     # If you want to test this on your machine, you'd better switch all your subscriptions to PARAMETER_TYPE.DEVICE.
 
-    callback_display_param = hub.CallbackParameters()
-    callback_display_param.set_parameter_callback("onDisplayParametersUpdate", "draw_bboxes", hub.CALLBACK_TYPE.ON_PARAMETER_UPDATE,  hub.PARAMETER_TYPE.APPLICATION);
-    hub.HubClient.register_function(on_display_parameters_update, callback_display_param);
+    # Each callback only fetches the parameters it is registered on
+    parameters.register_callback("onDisplayParametersUpdate", ["draw_bboxes"], on_parameters_update)
+    parameters.register_callback("onVideoEventUpdate", ["recordVideoEvent", "nbFramesNoDetBtw2Events"], on_parameters_update)
+    parameters.register_callback("onTelemetryUpdate", ["recordTelemetry", "telemetryFreq"], on_parameters_update)
 
-    callback_event_param = hub.CallbackParameters()
-    callback_event_param.set_parameter_callback("onVideoEventUpdate", "recordVideoEvent|nbFramesNoDetBtw2Events",  hub.CALLBACK_TYPE.ON_PARAMETER_UPDATE,  hub.PARAMETER_TYPE.APPLICATION);
-    hub.HubClient.register_function(on_video_event_update, callback_event_param);
+    # get values defined by the ZED Hub interface.
+    # Cached values (the defaults) are kept in case of failure
+    parameters.refresh()
 
-    callback_telemetry_param = hub.CallbackParameters()
-    callback_telemetry_param.set_parameter_callback("onTelemetryUpdate", "recordTelemetry|telemetryFreq",  hub.CALLBACK_TYPE.ON_PARAMETER_UPDATE,  hub.PARAMETER_TYPE.APPLICATION);
-    hub.HubClient.register_function(on_telemetry_update, callback_telemetry_param);
+    # Telemetry is sent from a background thread, and spooled on disk while ZED Hub is unreachable
+    telemetry = TelemetryClient("telemetry_spool.db")
+    telemetry.start()
 
-    # get values defined by the ZED Hub interface.
-    # Last argument is default value in case of failure
-    
-    raw_bboxes = hub.HubClient.get_parameter_bool(
-        "draw_bboxes", hub.PARAMETER_TYPE.APPLICATION, draw_bboxes)
-    recordVideoEvent = hub.HubClient.get_parameter_bool(
-        "recordVideoEvent", hub.PARAMETER_TYPE.APPLICATION, recordVideoEvent)
-    nbFramesNoDetBtw2Events = hub.HubClient.get_parameter_int(
-        "nbFramesNoDetBtw2Events", hub.PARAMETER_TYPE.APPLICATION, nbFramesNoDetBtw2Events)
-    recordTelemetry = hub.HubClient.get_parameter_bool(
-        "recordTelemetry", hub.PARAMETER_TYPE.APPLICATION, recordTelemetry)
-    telemetryFreq = hub.HubClient.get_parameter_float(
-        "telemetryFreq", hub.PARAMETER_TYPE.APPLICATION, telemetryFreq)
-    draw_bboxes = hub.HubClient.get_parameter_bool(
-        "draw_bboxes", hub.PARAMETER_TYPE.APPLICATION, True)
-
-    counter_no_detection = 0
     objects = sl.Objects()
-    event_reference = ""
-    first_event_sent = False
+    # Video events : a new event starts when someone is detected after nbFramesNoDetBtw2Events frames without
+    # detection, and is updated at most every 10 seconds
+    segmenter = VideoEventSegmenter(min_detections=1, end_frames=parameters.get("nbFramesNoDetBtw2Events"), update_interval=10000)
     prev_timestamp = zed.get_timestamp(sl.TIME_REFERENCE.CURRENT)
 
     image_left_custom = sl.Mat(1280, 720, sl.MAT_TYPE.U8_C4)
     image_raw_res = zed.get_camera_information().camera_configuration.resolution
 
+    # In pipelined mode, the bboxes of the custom stream are drawn by the render worker
+    timings = StageTimings()
+    render_worker = None
+    # Only read at startup
+    if parameters.get("pipelinedRendering"):
+        render_worker = RenderWorker(timings)
+    last_timings_report = time.monotonic()
+
     # Main loop
     while True:
+        grab_start = time.perf_counter()
         status_zed = zed.grab(runtime_params)
         if status_zed == sl.ERROR_CODE.SUCCESS:
+            timings.add("grab", time.perf_counter() - grab_start)
+            # Same parameter values for the whole frame, even if a callback updates them meanwhile
+            params = parameters.snapshot()
 
+            stage_start = time.perf_counter()
             zed.retrieve_objects(objects, object_detection_runtime_params)
             # /*******     Define event   *********/
             # /*
@@ -201,76 +299,61 @@ def main():
             # Cf README.md to understand how to use the event_reference to define a new event.
             # */
             current_ts = objects.timestamp
-
-            counter_reliable_objects = 0
-            for obj in objects.object_list:
-                if obj.tracking_state == sl.OBJECT_TRACKING_STATE.OK:
-                    counter_reliable_objects = counter_reliable_objects + 1
-
-            if recordVideoEvent and counter_reliable_objects >= 1:
-                is_new_event = True
-                if (not first_event_sent) or (counter_no_detection >= nbFramesNoDetBtw2Events):
-                    event_reference = "detected_person_" + \
-                        str(current_ts.get_milliseconds())
-                    hub.HubClient.send_log(
-                        "New Video Event defined", hub.LOG_LEVEL.INFO)
-
-                else:
-                    # Do nothing, keep previous event reference --> The current frame will be defined as being part of the previous video event
-                    is_new_event = False
-
-                event_params = hub.EventParameters()
-                event_params.timestamp = current_ts.get_milliseconds()
-                event_params.reference = event_reference
+            detections = DetectionSummary(objects)
+            timings.add("detection", time.perf_counter() - stage_start)
+
+            # Frames are counted as without detection while video events are disabled
+            segmenter.end_frames = params["nbFramesNoDetBtw2Events"]
+            transition = segmenter.process(current_ts.get_milliseconds(),
+                                           detections.reliable_count if params["recordVideoEvent"] else 0)
+            if transition is not None and transition.kind == START:
+                logger.info("New Video Event defined")
+            if transition is not None and params["recordVideoEvent"]:
                 event_label = "People Detection"  # or the label of your choice
                 # Use to store all the data associated to the video event.
                 event2send = {}
-                event2send["message"] = "Current event as reference " + \
-                    event_reference
-                event2send["nb_detected_person"] = len(objects.object_list)
-
-                if is_new_event or not first_event_sent:
-                    hub.HubClient.start_video_event(
-                        zed, event_label, event2send, event_params)
-                    first_event_sent = True
-
-                #  update every 10 s
-                elif current_ts.get_seconds() - prev_timestamp.get_seconds() >= 10:
-                    hub.HubClient.update_video_event(
-                        zed, event_label, event2send, event_params)
-                # else do nothing
-
-                counter_no_detection = 0  # reset counter as someone as been detected
-
-            else:
-                counter_no_detection = counter_no_detection + 1
+                event2send["message"] = "Current event as reference " + transition.reference
+                event2send["nb_detected_person"] = detections.count
+                send_video_event(zed, event_label, transition, event2send)
 
             #  /*******************************/
 
             # /*******     Define and send Telemetry   *********/
             # In this example we send every second the number of people detected and there mean distance to the camera
-            if recordTelemetry and (current_ts.get_seconds() >= prev_timestamp.get_seconds() + telemetryFreq):
-                mean_distance = 0.0
-                # compute objects ( = people)  mean distance from camera. This value will be sent as telemetry
-                for obj in objects.object_list:
-                    mean_distance += np.linalg.norm(obj.position)
-
-                if (len(objects.object_list) > 0):
-                    mean_distance = mean_distance / \
-                        (float)(len(objects.object_list))
-
-                # Send Telemetry
+            if params["recordTelemetry"] and (current_ts.get_seconds() >= prev_timestamp.get_seconds() + params["telemetryFreq"]):
+                # Send Telemetry : objects ( = people) count and mean distance from camera
                 position_telemetry = {}
-                position_telemetry["number_of_detection"] = len(
-                    objects.object_list)
-                position_telemetry["mean_distance_from_cam"] = mean_distance
-                hub.HubClient.send_telemetry(
-                    "object_detection", position_telemetry)
+                position_telemetry["number_of_detection"] = detections.count
+                position_telemetry["mean_distance_from_cam"] = detections.mean_distance()
+                telemetry.send("object_detection", position_telemetry)
                 prev_timestamp = current_ts
 
             #    /*******************************/
             #     /*******     Custom stream : Draw bboxes on custom stream   *********/
-            if(draw_bboxes):
+            stage_start = time.perf_counter()
+            if render_worker is not None:
+                # Frame of the previous grab, drawn meanwhile by the render worker
+                drawn = render_worker.collect()
+                if params["draw_bboxes"]:
+                    # The buffer belongs to the render worker once submitted, it comes back drawn on the next grab
+                    buffer = render_worker.acquire()
+                    zed.retrieve_image(buffer.mat, sl.VIEW.LEFT,
+                                       sl.MEM.CPU, buffer.mat.get_resolution())
+                    rows, cols, layers = buffer.data.shape
+                    boxes = detections.reliable_boxes(cols / float(image_raw_res.width), rows / float(image_raw_res.height))
+                    render_worker.submit(buffer, boxes)
+                    timings.add("submit", time.perf_counter() - stage_start)
+                upload_start = time.perf_counter()
+                # Hub is updated on every grab, with the drawn frame if there is one
+                if drawn is not None:
+                    drawn.mat.timestamp = sl.get_current_timestamp()
+                    hub.HubClient.update(zed, drawn.mat)
+                    render_worker.release(drawn)
+                else:
+                    hub.HubClient.update(zed)
+                timings.add("upload", time.perf_counter() - upload_start)
+
+            elif(params["draw_bboxes"]):
                 zed.retrieve_image(image_left_custom, sl.VIEW.LEFT,
                                    sl.MEM.CPU, image_left_custom.get_resolution())
 
@@ -283,19 +366,32 @@ def main():
                 ratio_x = (float)(cols/(float)(image_raw_res.width))
                 ratio_y = (float)(rows/(float)(image_raw_res.height))
 
-                for obj in objects.object_list:
-                    if obj.tracking_state == sl.OBJECT_TRACKING_STATE.OK:
-                        tl = obj.bounding_box_2d[0]
-                        br = obj.bounding_box_2d[2]
-                        cv2.rectangle(image_left_ocv, ((int)(tl[0]*ratio_x), (int)(tl[1]*ratio_y)), ((
-                            int)(br[0]*ratio_x), (int)(br[1]*ratio_y)), (50, 200, 50), 4)
+                # The 4 corners of each box are drawn as closed polygons in a single call
+                boxes = detections.reliable_boxes(ratio_x, ratio_y)
+                if len(boxes) > 0:
+                    cv2.polylines(image_left_ocv, list(boxes), True, (50, 200, 50), 4)
 
                 image_left_custom.timestamp = sl.get_current_timestamp()
                 hub.HubClient.update(zed, image_left_custom)
+                timings.add("draw_and_upload", time.perf_counter() - stage_start)
 
             else:
                 # Always update Hub at the end of the grab loop
                 hub.HubClient.update(zed)
+                timings.add("upload", time.perf_counter() - stage_start)
+
+            # Mean duration of each stage, every 10 seconds
+            if time.monotonic() - last_timings_report >= 10:
+                logger.debug("Stage timings (ms) : %s", timings.report())
+                last_timings_report = time.monotonic()
+
+    if render_worker is not None:
+        render_worker.stop()
+
+    # Send the pending telemetry, what cannot be sent stays in the spool for the next run
+    telemetry.stop()
+    # Send the pending logs before disconnecting
+    log_handler.close()
 
     if zed.is_opened():
         zed.close()
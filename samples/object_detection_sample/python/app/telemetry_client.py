@@ -0,0 +1,176 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import pyzed.sl_hub as hub
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+
+def send_telemetry(label, value):
+    return hub.HubClient.send_telemetry(label, value) == hub.STATUS_CODE.SUCCESS
+
+
+#
+# \brief Telemetry sent from a background thread, so that the grab loop never waits on the network.
+# Records are queued in memory (bounded, a record is dropped when the queue is full) and taken by batches.
+# ZED Hub takes one telemetry per call, so records are still sent one by one. The batch is what is written to disk.
+# When a send fails the link is considered offline : the records left are appended to a SQLite spool on disk in
+# one transaction, and a spooled record is retried every `retry_interval` seconds. Once a retry succeeds, the spool
+# is replayed oldest first, at most `replay_rate` records per second, alongside the live records.
+# Replayed records are sent unchanged, their queuing time is only kept in the spool.
+#
+class TelemetryClient:
+    # send : function(label, value) returning True if the telemetry was sent
+    def __init__(self, spool_path="telemetry_spool.db", max_queue=1000, batch_size=50, flush_interval=1.0,
+                 replay_rate=20.0, retry_interval=10.0, max_spool_records=100000, send=send_telemetry):
+        self.spool_path = spool_path
+        self.records = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.replay_rate = replay_rate
+        self.retry_interval = retry_interval
+        self.max_spool_records = max_spool_records
+        self.send_function = send
+        self.online = True
+        self.sent = 0
+        self.spooled = 0
+        self.dropped = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    #
+    # \brief Send the queued records, spooling what cannot be sent, and stop the thread
+    #
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    #
+    # \brief Queue a telemetry, never blocks
+    # \return False if the queue was full and the telemetry dropped
+    #
+    def send(self, label, value):
+        try:
+            self.records.put_nowait((int(time.time() * 1000), label, value))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def open_spool(self):
+        spool = sqlite3.connect(self.spool_path)
+        spool.execute("PRAGMA journal_mode=WAL")
+        spool.execute("CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp INTEGER, label TEXT, value TEXT)")
+        spool.commit()
+        return spool
+
+    def spool_size(self, spool):
+        return spool.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def append_to_spool(self, spool, records):
+        spool.executemany("INSERT INTO spool (timestamp, label, value) VALUES (?, ?, ?)",
+                          [(timestamp, label, json.dumps(value)) for timestamp, label, value in records])
+        # Bounded on disk too, the oldest records go first
+        excess = self.spool_size(spool) - self.max_spool_records
+        if excess > 0:
+            spool.execute("DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)", (excess,))
+        spool.commit()
+        self.spooled += len(records)
+
+    def send_record(self, label, value):
+        try:
+            return self.send_function(label, value)
+        except Exception:
+            return False
+
+    #
+    # \brief Send the spooled records, oldest first, removing them from the spool once sent
+    # \return the number of records sent
+    #
+    def replay(self, spool, count):
+        rows = spool.execute("SELECT id, timestamp, label, value FROM spool ORDER BY id LIMIT ?", (count,)).fetchall()
+        sent_ids = []
+        for row_id, timestamp, label, value in rows:
+            if not self.send_record(label, json.loads(value)):
+                self.online = False
+                break
+            sent_ids.append((row_id,))
+        spool.executemany("DELETE FROM spool WHERE id = ?", sent_ids)
+        spool.commit()
+        self.sent += len(sent_ids)
+        return len(sent_ids)
+
+    def flush(self, spool, batch):
+        if self.online:
+            for i, (timestamp, label, value) in enumerate(batch):
+                if not self.send_record(label, value):
+                    self.online = False
+                    batch = batch[i:]
+                    break
+                self.sent += 1
+            else:
+                batch = []
+        if len(batch) > 0:
+            self.append_to_spool(spool, batch)
+
+    def run(self):
+        spool = self.open_spool()
+        backlog = self.spool_size(spool)
+        last_retry = time.monotonic()
+        last_replay = time.monotonic()
+        replay_budget = 0.0
+        while True:
+            stopping = self.stopped.is_set()
+            # Next batch : wait for the first record, then take what is already queued
+            batch = []
+            try:
+                batch.append(self.records.get(timeout=0 if stopping else self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.records.get_nowait())
+            except queue.Empty:
+                pass
+            self.flush(spool, batch)
+            if stopping and self.records.empty():
+                break
+
+            now = time.monotonic()
+            if not self.online:
+                backlog = self.spool_size(spool)
+                # Probe the link with the oldest spooled record
+                if now >= last_retry + self.retry_interval:
+                    last_retry = now
+                    self.online = True
+                    backlog -= self.replay(spool, 1)
+                    last_replay = now
+                    replay_budget = 0.0
+            elif backlog > 0:
+                replay_budget = min(replay_budget + (now - last_replay) * self.replay_rate, self.replay_rate)
+                last_replay = now
+                if replay_budget >= 1:
+                    sent = self.replay(spool, int(replay_budget))
+                    replay_budget -= sent
+                    backlog = self.spool_size(spool)
+        spool.close()
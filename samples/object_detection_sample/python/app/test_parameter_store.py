@@ -0,0 +1,156 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_parameter_store.py
+# The ZED SDK is not needed : parameter_store.py is loaded with a fake pyzed and a stand-in ZED Hub client.
+# The gnss_tracker_sample holds a copy of the same module.
+
+import importlib.util
+import json
+import os
+import sys
+import types
+
+import pytest
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+TYPES = {
+    "draw_bboxes": bool,
+    "recordVideoEvent": bool,
+    "nbFramesNoDetBtw2Events": int,
+    "telemetryFreq": float,
+}
+
+
+# Values of the parameters on ZED Hub, every getter call is recorded
+class FakeHubClient:
+    def __init__(self, values):
+        self.values = values
+        self.calls = []
+        self.functions = []
+
+    def get_parameter(self, name, parameter_type, default):
+        self.calls.append(name)
+        return self.values.get(name, default)
+
+    get_parameter_bool = get_parameter
+    get_parameter_int = get_parameter
+    get_parameter_float = get_parameter
+    get_parameter_string = get_parameter
+
+    def register_function(self, callback, callback_params):
+        self.functions.append((callback, callback_params))
+
+
+class FakeCallbackParameters:
+    def set_parameter_callback(self, callback_name, names, callback_type, parameter_type):
+        self.names = names.split("|")
+
+
+@pytest.fixture
+def parameter_store(monkeypatch):
+    hub = types.ModuleType("pyzed.sl_hub")
+    hub.HubClient = None
+    hub.PARAMETER_TYPE = types.SimpleNamespace(APPLICATION=0)
+    hub.CALLBACK_TYPE = types.SimpleNamespace(ON_PARAMETER_UPDATE=0)
+    hub.CallbackParameters = FakeCallbackParameters
+    pyzed = types.ModuleType("pyzed")
+    pyzed.sl_hub = hub
+    monkeypatch.setitem(sys.modules, "pyzed", pyzed)
+    monkeypatch.setitem(sys.modules, "pyzed.sl_hub", hub)
+    spec = importlib.util.spec_from_file_location("object_detection_parameter_store", os.path.join(DIRECTORY, "parameter_store.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_defaults_are_read_whatever_the_working_directory(parameter_store, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    store = parameter_store.ParameterStore(TYPES, client=FakeHubClient({}))
+    store.load_defaults()
+    with open(os.path.join(DIRECTORY, "parameters.json")) as f:
+        expected = json.load(f)
+    assert store.get("nbFramesNoDetBtw2Events") == expected["nbFramesNoDetBtw2Events"]
+    assert store.get("telemetryFreq") == expected["telemetryFreq"]
+    assert store.get("draw_bboxes") is expected["draw_bboxes"]
+
+
+def test_string_booleans_are_parsed(parameter_store, tmp_path):
+    path = tmp_path / "parameters.json"
+    path.write_text(json.dumps({"draw_bboxes": "false", "recordVideoEvent": "True", "nbFramesNoDetBtw2Events": "12"}))
+    store = parameter_store.ParameterStore(TYPES, client=FakeHubClient({"draw_bboxes": "true"}))
+    store.load_defaults([str(path)])
+    assert store.get("draw_bboxes") is False
+    assert store.get("recordVideoEvent") is True
+    assert store.get("nbFramesNoDetBtw2Events") == 12
+    store.refresh(["draw_bboxes"])
+    assert store.get("draw_bboxes") is True
+    with pytest.raises(ValueError):
+        parameter_store.parse_value(bool, "maybe")
+
+
+def test_refresh_only_reads_the_named_keys(parameter_store):
+    client = FakeHubClient({"draw_bboxes": True, "nbFramesNoDetBtw2Events": 30, "telemetryFreq": 5.0})
+    store = parameter_store.ParameterStore(TYPES, client=client)
+    changed = store.refresh(["draw_bboxes", "telemetryFreq"])
+    assert client.calls == ["draw_bboxes", "telemetryFreq"]
+    assert changed == ["draw_bboxes", "telemetryFreq"]
+    # Not refreshed, still the default
+    assert store.get("nbFramesNoDetBtw2Events") == 0
+
+
+def test_refresh_returns_only_the_changed_keys(parameter_store):
+    client = FakeHubClient({"draw_bboxes": True, "nbFramesNoDetBtw2Events": 30})
+    store = parameter_store.ParameterStore(TYPES, client=client)
+    assert sorted(store.refresh()) == ["draw_bboxes", "nbFramesNoDetBtw2Events"]
+    assert store.refresh() == []
+    client.values["nbFramesNoDetBtw2Events"] = 10
+    assert store.refresh() == ["nbFramesNoDetBtw2Events"]
+
+
+def test_snapshot_is_read_only_and_kept_by_a_refresh(parameter_store):
+    client = FakeHubClient({"draw_bboxes": True})
+    store = parameter_store.ParameterStore(TYPES, client=client)
+    before = store.snapshot()
+    store.refresh()
+    after = store.snapshot()
+    # A snapshot taken before the refresh is still consistent
+    assert before["draw_bboxes"] is False
+    assert after["draw_bboxes"] is True
+    with pytest.raises(TypeError):
+        after["draw_bboxes"] = False
+
+
+def test_callback_refreshes_its_keys_and_reports_changes(parameter_store):
+    client = FakeHubClient({})
+    store = parameter_store.ParameterStore(TYPES, client=client)
+    changes = []
+    callback = store.register_callback("on_display_update", ["draw_bboxes"], changes.append)
+    assert client.functions[0][1].names == ["draw_bboxes"]
+    # Same value on ZED Hub : no change reported
+    callback(None)
+    assert changes == []
+    client.values["draw_bboxes"] = True
+    client.values["telemetryFreq"] = 1.0
+    callback(None)
+    assert changes == [["draw_bboxes"]]
+    assert client.calls == ["draw_bboxes", "draw_bboxes"]
+    assert store.get("telemetryFreq") == 0.0
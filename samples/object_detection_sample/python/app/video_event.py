@@ -0,0 +1,114 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+from collections import namedtuple
+
+START = "start"
+UPDATE = "update"
+END = "end"
+
+# A change of the video event, timestamp in milliseconds
+VideoEventTransition = namedtuple("VideoEventTransition", ["kind", "reference", "timestamp", "detections"])
+
+
+#
+# \brief Splits a stream of per-frame detection counts into video events.
+# An event starts once `start_frames` consecutive frames have at least `min_detections` detections, and at least
+# `min_gap` ms after the end of the previous event. It ends after `end_frames` consecutive frames below that.
+# While it lasts, an update is emitted at most every `update_interval` ms, for a frame with detections.
+# Only the transitions are returned, so the ZED Hub calls are limited to one start per event and one update
+# per interval whatever the frame rate. Parameters can be changed between two frames.
+#
+class VideoEventSegmenter:
+    def __init__(self, min_detections=1, start_frames=1, end_frames=10, min_gap=0, update_interval=2000,
+                 reference_prefix="detected_person_"):
+        self.min_detections = min_detections
+        self.start_frames = start_frames
+        self.end_frames = end_frames
+        self.min_gap = min_gap
+        self.update_interval = update_interval
+        self.reference_prefix = reference_prefix
+        self.reference = None
+        self.hits = 0
+        self.misses = 0
+        self.last_update = 0
+        self.last_end = None
+
+    def is_active(self):
+        return self.reference is not None
+
+    #
+    # \brief Process the detection count of a frame
+    # \return the VideoEventTransition of this frame, None if the event did not change
+    #
+    def process(self, timestamp, detections):
+        detected = detections >= self.min_detections
+        if not self.is_active():
+            self.hits = self.hits + 1 if detected else 0
+            if self.hits < self.start_frames:
+                return None
+            if self.last_end is not None and timestamp < self.last_end + self.min_gap:
+                return None
+            self.reference = self.reference_prefix + str(timestamp)
+            self.hits = 0
+            self.misses = 0
+            self.last_update = timestamp
+            return VideoEventTransition(START, self.reference, timestamp, detections)
+
+        if not detected:
+            self.misses += 1
+            if self.misses < self.end_frames:
+                return None
+            return self.finish(timestamp)
+
+        self.misses = 0
+        if timestamp < self.last_update + self.update_interval:
+            return None
+        self.last_update = timestamp
+        return VideoEventTransition(UPDATE, self.reference, timestamp, detections)
+
+    #
+    # \brief End the current event, if any
+    #
+    def finish(self, timestamp):
+        if not self.is_active():
+            return None
+        transition = VideoEventTransition(END, self.reference, timestamp, 0)
+        self.reference = None
+        self.misses = 0
+        self.last_end = timestamp
+        return transition
+
+
+#
+# \brief Start or update the video event of a transition on ZED Hub, an end needs no call.
+# pyzed is only imported here, so that the segmenter can be replayed offline without the ZED SDK.
+#
+def send_video_event(zed, label, transition, data):
+    import pyzed.sl_hub as hub
+    if transition.kind == END:
+        return
+    event_params = hub.EventParameters()
+    event_params.timestamp = transition.timestamp
+    event_params.reference = transition.reference
+    if transition.kind == START:
+        hub.HubClient.start_video_event(zed, label, data, event_params)
+    else:
+        hub.HubClient.update_video_event(zed, label, data, event_params)
@@ -0,0 +1,101 @@
+#!/bin/python3
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import export_telemetry
+
+# Stand-in for the ZED Hub telemetry endpoint, serving synthetic paginated telemetry.
+# Every answer takes `latency` seconds and one request out of `rate_limit_every` is answered 429.
+class TelemetryHandler(BaseHTTPRequestHandler) :
+    pages = 100
+    page_size = 100
+    latency = 0.05
+    rate_limit_every = 0
+    request_count = 0
+    count_lock = threading.Lock()
+
+    def do_GET(self) :
+        with TelemetryHandler.count_lock :
+            TelemetryHandler.request_count = TelemetryHandler.request_count + 1
+            request_count = TelemetryHandler.request_count
+        time.sleep(self.latency)
+        if self.rate_limit_every > 0 and request_count % self.rate_limit_every == 0 :
+            self.send_response(429)
+            self.send_header("Retry-After", "0.2")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        page = int(parse_qs(urlparse(self.path).query).get("page", ["1"])[0])
+        telemetry = []
+        if page <= self.pages :
+            for i in range(self.page_size) :
+                telemetry_id = (page - 1) * self.page_size + i
+                telemetry.append({"id" : telemetry_id, "timestamp" : telemetry_id, "label" : "benchmark", "payload" : {"value" : i}})
+        body = json.dumps({"telemetry" : telemetry}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) :
+        pass
+
+def sequential_export(url) :
+    # Previous behaviour : one page at a time, new connection for each request and a fixed 100ms sleep
+    import requests
+    count = 0
+    page = 1
+    while True :
+        r = requests.get(url + "?page=" + str(page))
+        telemetry_array = r.json()["telemetry"] if r.status_code == 200 else []
+        if r.status_code == 200 and len(telemetry_array) == 0 :
+            break
+        count = count + len(telemetry_array)
+        if r.status_code == 200 :
+            page = page + 1
+        time.sleep(0.1)
+    return count
+
+def parallel_export(url, workers) :
+    counter = {"count" : 0}
+    def on_page(page, telemetry_array) :
+        counter["count"] = counter["count"] + len(telemetry_array)
+    session = export_telemetry.create_session({}, workers)
+    export_telemetry.fetch_pages(session, url, {}, 1, workers, export_telemetry.RateLimiter(), on_page)
+    session.close()
+    return counter["count"]
+
+def main() :
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", help="Number of telemetry pages served", type=int, default=100)
+    parser.add_argument("--page_size", help="Number of telemetries per page", type=int, default=100)
+    parser.add_argument("--latency", help="Server answer latency, in seconds", type=float, default=0.05)
+    parser.add_argument("--rate_limit_every", help="Answer 429 to one request out of N (0 to disable)", type=int, default=0)
+    parser.add_argument("--workers", help="Numbers of workers to benchmark", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    TelemetryHandler.pages = args.pages
+    TelemetryHandler.page_size = args.page_size
+    TelemetryHandler.latency = args.latency
+    TelemetryHandler.rate_limit_every = args.rate_limit_every
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelemetryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:" + str(server.server_address[1]) + "/api/v1/workspaces/1/telemetry"
+
+    start = time.perf_counter()
+    count = sequential_export(url)
+    print("sequential          :", count, "telemetries in", round(time.perf_counter() - start, 2), "s")
+    for workers in args.workers :
+        start = time.perf_counter()
+        count = parallel_export(url, workers)
+        print("parallel, workers", str(workers).ljust(2), ":", count, "telemetries in", round(time.perf_counter() - start, 2), "s")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
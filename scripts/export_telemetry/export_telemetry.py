@@ -1,10 +1,31 @@
 #!/bin/python3
+import datetime
 import json
+import os
+import queue
 import requests
+import threading
 import time
 import pymongo
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from email.utils import parsedate_to_datetime
 from pymongo import MongoClient
-from time import sleep
+from requests.adapters import HTTPAdapter
+
+# Number of retries of a page on network errors, 429 or 5xx answers before giving up
+MAX_RETRIES = 5
+# MongoDB error code of a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+# Telemetries are kept 30 days on ZED Hub
+RETENTION_MS = 30 * 24 * 60 * 60 * 1000
+# Number of times a time shard is resumed after a page failed for good
+SHARD_RETRIES = 3
+
+class ExportError(Exception):
+    # status_code : HTTP status of a request refused by the server (4xx), None for errors worth retrying
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
 
 def get_current_milliseconds_round():
     return round(time.time() * 1000)
@@ -17,11 +38,6 @@ def load_config() :
     config = json.load(f)
     global cloud_url
     cloud_url = config["cloud_url"]
-    if cloud_url == "" :
-        print("Wrong \"cloud_url\" value in config. Check config_export_telemetry.json.")
-        exit(1)
-    global cloud_url
-    cloud_url = config["cloud_url"]
     if cloud_url == "" :
         print("Wrong \"cloud_url\" value in config. Check config_export_telemetry.json.")
         exit(1)
@@ -37,9 +53,311 @@ def load_config() :
         exit(1)
     global http
     http = config["protocol"]
-    if http != "http://" or http != "https://" :
+    if http != "http://" and http != "https://" :
         print("Wrong \"protocol\" value in config. Check config_export_telemetry.json.")
         exit(1)
+    global max_workers
+    max_workers = config.get("max_workers", 4)
+    if max_workers < 1 :
+        print("Wrong \"max_workers\" value in config. Check config_export_telemetry.json.")
+        exit(1)
+    global checkpoint_file
+    checkpoint_file = config.get("checkpoint_file", "export_telemetry_checkpoint.json")
+    global batch_size
+    batch_size = config.get("batch_size", 1000)
+    if batch_size < 1 :
+        print("Wrong \"batch_size\" value in config. Check config_export_telemetry.json.")
+        exit(1)
+    global incremental
+    incremental = config.get("incremental", False)
+    global shard_hours
+    shard_hours = config.get("shard_hours", 0)
+    if shard_hours < 0 :
+        print("Wrong \"shard_hours\" value in config. Check config_export_telemetry.json.")
+        exit(1)
+
+def parse_retry_after(value) :
+    # Retry-After is either a number of seconds or an HTTP date
+    if value is None :
+        return None
+    try :
+        return max(0.0, float(value))
+    except ValueError :
+        pass
+    try :
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError) :
+        return None
+
+class RateLimiter :
+    # Request pacing shared by all the fetching threads.
+    # The delay between two requests doubles each time the server answers 429 (Too Many Requests)
+    # and slowly shrinks back while it answers normally. A Retry-After header pauses every thread.
+    def __init__(self, min_interval=0.0, max_interval=10.0) :
+        self.lock = threading.Lock()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_request_time = 0.0
+
+    def wait(self) :
+        with self.lock :
+            now = time.monotonic()
+            scheduled = max(now, self.next_request_time)
+            self.next_request_time = scheduled + self.interval
+        if scheduled > now :
+            time.sleep(scheduled - now)
+
+    def on_success(self) :
+        with self.lock :
+            self.interval = max(self.min_interval, self.interval * 0.9)
+
+    def on_rate_limited(self, retry_after) :
+        with self.lock :
+            self.interval = min(self.max_interval, max(self.interval * 2, 0.05))
+            if retry_after is not None :
+                self.next_request_time = max(self.next_request_time, time.monotonic() + retry_after)
+
+def create_session(headers, pool_size) :
+    # One pooled session for all the threads, so that connections are kept alive between pages
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_page(session, telemetry_url, params, page, rate_limiter) :
+    page_params = dict(params)
+    page_params["page"] = page
+    retries = 0
+    while True :
+        rate_limiter.wait()
+        rate_limited = False
+        try :
+            r = session.get(telemetry_url, params=page_params, timeout=30)
+        except requests.RequestException as e :
+            error = str(e)
+        else :
+            if r.status_code == 200 :
+                rate_limiter.on_success()
+                return r.json()["telemetry"]
+            if r.status_code == 429 :
+                # The limiter slows every thread down, rate limited requests still count as retries
+                rate_limiter.on_rate_limited(parse_retry_after(r.headers.get("Retry-After")))
+                rate_limited = True
+            elif r.status_code < 500 :
+                raise ExportError("Cannot get telemetries page " + str(page) + ", error " + str(r.status_code) + "\n" + r.text, r.status_code)
+            error = "error " + str(r.status_code)
+        retries = retries + 1
+        if retries > MAX_RETRIES :
+            raise ExportError("Cannot get telemetries page " + str(page) + " after " + str(MAX_RETRIES) + " retries, " + error)
+        if not rate_limited :
+            time.sleep(min(30.0, 0.5 * 2 ** retries))
+
+def fetch_pages(session, telemetry_url, params, first_page, workers, rate_limiter, on_page) :
+    # Up to `workers` pages are requested at the same time. As soon as a page comes back empty
+    # there are no more telemetries to get (last page) and no page after it is requested anymore.
+    # on_page(page, telemetry_array) is called from this thread, in completion order.
+    next_page = first_page
+    empty_page = None
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor :
+        while True :
+            while len(pending) < workers and (empty_page is None or next_page < empty_page) :
+                future = executor.submit(fetch_page, session, telemetry_url, params, next_page, rate_limiter)
+                pending[future] = next_page
+                next_page = next_page + 1
+            if len(pending) == 0 :
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done :
+                page = pending.pop(future)
+                telemetry_array = future.result()
+                if len(telemetry_array) == 0 and (empty_page is None or page < empty_page) :
+                    empty_page = page
+                on_page(page, telemetry_array)
+
+def make_shards(start, end, shard_ms) :
+    # Split the time window in consecutive shards, each one walked through its own shallow pagination
+    shards = []
+    shard_start = start
+    while shard_start < end :
+        shard_end = min(end, shard_start + shard_ms)
+        shards.append({"start" : shard_start, "end" : shard_end, "page" : 0})
+        shard_start = shard_end
+    return shards
+
+def format_milliseconds(timestamp) :
+    return datetime.datetime.fromtimestamp(timestamp / 1000).strftime("%m/%d/%Y, %H:%M:%S")
+
+def fetch_shard(session, telemetry_url, shard, rate_limiter, on_page) :
+    # Pages of a shard are requested one after the other, shards are fetched in parallel.
+    # If a page fails for good, the shard is resumed from this page a few times before giving up.
+    # A request refused by the server (4xx other than 429) would be refused again, it is not retried.
+    params = {"start" : shard["start"], "end" : shard["end"]}
+    page = shard["page"] + 1
+    count = 0
+    retries = 0
+    while True :
+        try :
+            telemetry_array = fetch_page(session, telemetry_url, params, page, rate_limiter)
+        except ExportError as e :
+            retries = retries + 1
+            if e.status_code is not None or retries > SHARD_RETRIES :
+                raise
+            print("Shard from "+format_milliseconds(shard["start"])+" : "+str(e)+", retrying")
+            time.sleep(5 * retries)
+            continue
+        on_page(page, telemetry_array)
+        if len(telemetry_array) == 0 :
+            return count
+        count = count + len(telemetry_array)
+        page = page + 1
+
+def fetch_shards(session, telemetry_url, shards, workers, rate_limiter, on_shard_page) :
+    # on_shard_page(index, page, telemetry_array) is called from the shard threads
+    def run_shard(index) :
+        return fetch_shard(session, telemetry_url, shards[index], rate_limiter,
+                           lambda page, telemetry_array : on_shard_page(index, page, telemetry_array))
+    done_count = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor :
+        futures = {executor.submit(run_shard, index) : index for index in range(len(shards))}
+        pending = set(futures)
+        while len(pending) > 0 :
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done :
+                count = future.result()
+                shard = shards[futures[future]]
+                done_count = done_count + 1
+                print("Shard "+str(done_count)+"/"+str(len(shards))+" done : "+str(count)+" telemetries from "
+                      +format_milliseconds(shard["start"])+" to "+format_milliseconds(shard["end"]))
+
+def load_checkpoint() :
+    if not os.path.exists(checkpoint_file) :
+        return None
+    with open(checkpoint_file) as f :
+        checkpoint = json.load(f)
+    if checkpoint.get("workspace_id") != workspace_id :
+        return None
+    return checkpoint
+
+checkpoint_lock = threading.Lock()
+
+def save_checkpoint(checkpoint) :
+    # Write then rename, so that an interruption never leaves a truncated checkpoint
+    with checkpoint_lock :
+        tmp_file = checkpoint_file + ".tmp"
+        with open(tmp_file, "w") as f :
+            json.dump(checkpoint, f)
+        os.replace(tmp_file, checkpoint_file)
+
+def get_watermark(db) :
+    # Timestamp of the most recent telemetry exported from the workspace, None before the first export
+    state = db["export_state"].find_one({"_id" : workspace_id})
+    if state is None :
+        return None
+    return state.get("watermark")
+
+def update_watermark(db, collection) :
+    latest = collection.find_one({}, sort=[("timestamp", pymongo.DESCENDING)], projection={"timestamp" : True})
+    if latest is None or "timestamp" not in latest :
+        return None
+    db["export_state"].update_one({"_id" : workspace_id}, {"$max" : {"watermark" : latest["timestamp"]}}, upsert=True)
+    return get_watermark(db)
+
+class PageCommitter :
+    # Pages complete out of order, the checkpoint only moves forward
+    # once every page before it has been stored.
+    # `state` is the part of the checkpoint holding the page : the checkpoint itself or one of its shards.
+    def __init__(self, checkpoint, state=None) :
+        self.lock = threading.Lock()
+        self.checkpoint = checkpoint
+        self.state = checkpoint if state is None else state
+        self.done_pages = set()
+
+    def page_done(self, page) :
+        with self.lock :
+            self.done_pages.add(page)
+            committed = self.state["page"]
+            while committed + 1 in self.done_pages :
+                committed = committed + 1
+                self.done_pages.remove(committed)
+            if committed != self.state["page"] :
+                with checkpoint_lock :
+                    self.state["page"] = committed
+                save_checkpoint(self.checkpoint)
+
+class Ingester :
+    # Writes the fetched pages to MongoDB from its own thread, so that pages keep downloading
+    # while the previous batch is written. Telemetries are inserted by batches of `batch_size`
+    # with unordered insert_many : a duplicate does not stop the rest of the batch, it is only counted.
+    def __init__(self, collection, batch_size, on_pages_stored, idle_flush=1.0) :
+        self.collection = collection
+        self.batch_size = batch_size
+        self.on_pages_stored = on_pages_stored
+        self.idle_flush = idle_flush
+        # Bounded, so that fetching waits for ingest instead of filling the memory
+        self.queue = queue.Queue(maxsize=16)
+        self.inserted = 0
+        self.duplicates = 0
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def put(self, page, telemetry_array) :
+        if self.error is not None :
+            raise ExportError("Cannot insert telemetries : " + str(self.error))
+        self.queue.put((page, telemetry_array))
+
+    def close(self) :
+        # Flush what is left and wait for the ingest thread
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None :
+            raise ExportError("Cannot insert telemetries : " + str(self.error))
+
+    def run(self) :
+        pages = []
+        documents = []
+        finished = False
+        while not finished :
+            try :
+                item = self.queue.get(timeout=self.idle_flush)
+            except queue.Empty :
+                item = False
+            if item is None :
+                finished = True
+            elif item is not False :
+                pages.append(item[0])
+                documents.extend(item[1])
+            # Write when the batch is full, when fetching is idle or at the end
+            if len(pages) > 0 and (item is None or item is False or len(documents) >= self.batch_size) :
+                if self.error is None :
+                    try :
+                        self.insert(documents)
+                        self.on_pages_stored(pages)
+                    except Exception as e :
+                        # Keep consuming the queue so that fetching threads are not blocked
+                        self.error = e
+                pages = []
+                documents = []
+
+    def insert(self, documents) :
+        for i in range(0, len(documents), self.batch_size) :
+            batch = documents[i:i + self.batch_size]
+            if len(batch) == 0 :
+                continue
+            try :
+                result = self.collection.insert_many(batch, ordered=False)
+                self.inserted = self.inserted + len(result.inserted_ids)
+            except pymongo.errors.BulkWriteError as e :
+                write_errors = e.details.get("writeErrors", [])
+                other_errors = [error for error in write_errors if error.get("code") != DUPLICATE_KEY_ERROR]
+                if len(other_errors) > 0 :
+                    raise
+                self.inserted = self.inserted + e.details.get("nInserted", 0)
+                self.duplicates = self.duplicates + len(write_errors)
 
 def main() :
     # Load config file to get all the parameters to make requests to the server
@@ -51,50 +369,72 @@ def main() :
     collection = db["telemetry_ws_"+str(workspace_id)]
     # Make telemetry id unique index
     collection.create_index([("id",pymongo.ASCENDING)],unique=True)
+    # Used to find the most recent telemetry exported
+    collection.create_index([("timestamp",pymongo.DESCENDING)])
 
     # Construct request
     headers = {'Content-Type' : 'application/json', 'Authorization': api_token}
     telemetry_url = http+cloud_url+'/api/v1/workspaces/'+str(workspace_id)+'/telemetry'
 
-    # Get telemetries between now and 30 days before
-    now = get_current_milliseconds_round()
-    start = now - 30 * 24 * 60 * 60 * 1000
-    end = now
-    telemetry_url_parameter =telemetry_url + "?start=" + str(start) + "&end=" + str(end)
-    
+    # Resume an interrupted export from its last committed page, on the same time window
+    checkpoint = load_checkpoint()
+    if checkpoint is not None :
+        print("Resuming export from "+checkpoint_file)
+    else :
+        # Get telemetries between now and 30 days before
+        now = get_current_milliseconds_round()
+        start = now - RETENTION_MS
+        # In incremental mode, only get telemetries from the last one already exported
+        if incremental :
+            watermark = get_watermark(db)
+            if watermark is not None and watermark > start :
+                start = watermark
+                print("Incremental export from timestamp "+str(start))
+        checkpoint = {"workspace_id" : workspace_id, "start" : start, "end" : now}
+        # In sharded mode, the window is split in time shards fetched in parallel. Otherwise pages of the whole window are fetched in parallel
+        if shard_hours > 0 :
+            checkpoint["shards"] = make_shards(start, now, round(shard_hours * 60 * 60 * 1000))
+        else :
+            checkpoint["page"] = 0
+        save_checkpoint(checkpoint)
+
+    def pages_stored(pages) :
+        for committer, page in pages :
+            committer.page_done(page)
+
+    # Add telemetries to local db while they are fetched
+    ingester = Ingester(collection, batch_size, pages_stored)
+
     # Pagination loop, we don't get telemetries all at once so we have to get them using multiple requests with the page parameter
-    page = 1
-    finished = False
     print("Retrieving telemetries from workspace "+str(workspace_id)+"...")
-    while (not finished) :
-        # Get request
-        telemetry_url_page = telemetry_url_parameter + "&page=" + str(page)
-        r = requests.get(telemetry_url_page, headers=headers)
-        if r.status_code != 200 :
-            print("Cannot get telemetries, error",r.status_code)
-            print(r.text)
-            finished = True
-            exit(1)
-        else :
-            telemetry_data = r.json()
-            telemetry_array = telemetry_data["telemetry"]
-            # If telemetry array is empty there are no more telemetries to get (last page), exit
-            if len(telemetry_array) == 0 :
-                finished = True
+    session = create_session(headers, max_workers)
+    try :
+        try :
+            if "shards" in checkpoint :
+                shards = checkpoint["shards"]
+                committers = [PageCommitter(checkpoint, shard) for shard in shards]
+                print("Fetching "+str(len(shards))+" time shards")
+                fetch_shards(session, telemetry_url, shards, max_workers, RateLimiter(),
+                             lambda index, page, telemetry_array : ingester.put((committers[index], page), telemetry_array))
             else :
-                # Add telemetries to local db
-                for telemetry_element in telemetry_array :
-                    try :
-                        collection.insert_one(telemetry_element)
-                    except pymongo.errors.DuplicateKeyError :
-                        print("Telemetry of id ",str(telemetry_element["id"])," was already inserted.")
-        # Increment page
-        page = page +1
-        # Sleep 100ms to not be rate limited
-        sleep(0.1)
+                params = {"start" : checkpoint["start"], "end" : checkpoint["end"]}
+                committer = PageCommitter(checkpoint)
+                fetch_pages(session, telemetry_url, params, checkpoint["page"] + 1, max_workers, RateLimiter(),
+                            lambda page, telemetry_array : ingester.put((committer, page), telemetry_array))
+        finally :
+            session.close()
+            ingester.close()
+    except ExportError as e :
+        print(e)
+        print("Export interrupted, run the script again to resume it.")
+        exit(1)
+    print(str(ingester.inserted)+" telemetries inserted, "+str(ingester.duplicates)+" were already inserted.")
 
+    # The export is complete, the next run starts a new one
+    update_watermark(db, collection)
+    os.remove(checkpoint_file)
     client.close()
     print("Done")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
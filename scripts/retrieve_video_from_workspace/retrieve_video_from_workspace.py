@@ -22,6 +22,242 @@
 import argparse
 import requests
 import datetime
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# Size of the chunks written to disk while downloading, the whole video is never held in memory
+CHUNK_SIZE = 1024 * 1024
+# Number of times a failed video (or time chunk of a video) is downloaded again
+DOWNLOAD_RETRIES = 3
+
+# Download progress shared by all the downloading threads, printed every `interval` seconds
+class Progress:
+    def __init__(self, total_videos, interval=5.0):
+        self.lock = threading.Lock()
+        self.total_videos = total_videos
+        self.interval = interval
+        self.done_videos = 0
+        self.failed_videos = 0
+        self.downloaded_bytes = 0
+        self.start_time = time.monotonic()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def add_bytes(self, size):
+        with self.lock:
+            self.downloaded_bytes += size
+
+    def video_done(self):
+        with self.lock:
+            self.done_videos += 1
+
+    def video_failed(self):
+        with self.lock:
+            self.failed_videos += 1
+
+    def report(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.start_time
+            throughput = self.downloaded_bytes / elapsed / 1e6 if elapsed > 0 else 0
+            print('Progress:', self.done_videos, '/', self.total_videos, 'videos,', self.failed_videos, 'failed,',
+                  round(self.downloaded_bytes / 1e6, 1), 'MB in', round(elapsed, 1), 's (' + str(round(throughput, 2)), 'MB/s)')
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.report()
+
+class DownloadError(Exception):
+    # status_code : HTTP status of the failed request, None if the request itself succeeded
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+def is_retryable(error):
+    # Server errors, rate limiting and connection errors may succeed later, other HTTP errors would fail again.
+    # A truncated download (no status code) is resumed from its .part file.
+    if isinstance(error, DownloadError):
+        return error.status_code is None or error.status_code >= 500 or error.status_code == 429
+    return isinstance(error, requests.RequestException)
+
+def parse_content_range_total(content_range):
+    # "bytes 0-99/1234" or "bytes */1234"
+    if content_range is None or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1]
+    return int(total) if total.isdigit() else None
+
+def get_remote_size(session, video_url, video_params):
+    # Ask for the first byte only : a range-capable server answers 206 with the total size
+    with session.get(video_url, params=video_params, headers={'Range': 'bytes=0-0'}, stream=True, timeout=60) as r:
+        if r.status_code == 206:
+            return parse_content_range_total(r.headers.get('Content-Range'))
+        if r.status_code != 200:
+            raise DownloadError(str(r.status_code) + ' : ' + r.reason, r.status_code)
+    return None
+
+def download_range(session, video_url, video_params, part_path, progress, first=0, last=None):
+    # Download the bytes [first, last] (until the end if last is None) into part_path.
+    # If part_path already holds the beginning of the range, only the rest is requested.
+    # Returns the expected size of part_path once complete, None if the server does not tell it.
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    expected = None if last is None else last - first + 1
+    if expected is not None and offset >= expected:
+        return expected
+    headers = {}
+    if first + offset > 0 or last is not None:
+        headers['Range'] = 'bytes=' + str(first + offset) + '-' + ('' if last is None else str(last))
+    with session.get(video_url, params=video_params, headers=headers, stream=True, timeout=60) as r:
+        if r.status_code == 416 and last is None:
+            # Nothing left after offset : the part file is already complete
+            total = parse_content_range_total(r.headers.get('Content-Range'))
+            if total == offset:
+                return total
+        if r.status_code == 200 and first == 0 and last is None:
+            # The server ignored the range, start over
+            mode = 'wb'
+            content_length = r.headers.get('Content-Length')
+            expected = int(content_length) if content_length is not None else None
+        elif r.status_code == 206:
+            mode = 'ab'
+            if last is None:
+                expected = parse_content_range_total(r.headers.get('Content-Range'))
+        else:
+            raise DownloadError(str(r.status_code) + ' : ' + r.reason, r.status_code)
+        # Stream the video to disk chunk by chunk
+        with open(part_path, mode) as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                progress.add_bytes(len(chunk))
+    return expected
+
+def download_video(session, video_url, video_params, path, progress, segments=1):
+    # The video is downloaded in path + '.part', verified, then renamed to path.
+    # An interrupted download is resumed from what is already in the .part file(s).
+    part_path = path + '.part'
+    total = None
+    if segments > 1:
+        total = get_remote_size(session, video_url, video_params)
+        if total is None:
+            print('Ranges are not supported for', path, ', downloading it in one stream')
+            segments = 1
+        elif total < segments:
+            # Too small to be split (or empty), a single range is enough
+            segments = 1
+
+    if segments > 1:
+        # Download `segments` ranges of the file in parallel, then put them together
+        segment_size = -(-total // segments)
+        ranges = [(first, min(total, first + segment_size) - 1) for first in range(0, total, segment_size)]
+        segment_paths = [part_path + str(i) for i in range(len(ranges))]
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(download_range, session, video_url, video_params, segment_path, progress, first, last)
+                       for segment_path, (first, last) in zip(segment_paths, ranges)]
+            for future in futures:
+                future.result()
+        with open(part_path, 'wb') as f:
+            for segment_path in segment_paths:
+                with open(segment_path, 'rb') as segment:
+                    shutil.copyfileobj(segment, f, CHUNK_SIZE)
+        for segment_path in segment_paths:
+            os.remove(segment_path)
+        expected = total
+    else:
+        expected = download_range(session, video_url, video_params, part_path, progress)
+
+    # Check the size before making the video visible
+    size = os.path.getsize(part_path)
+    if expected is not None and size != expected:
+        if size > expected:
+            os.remove(part_path)
+        raise DownloadError('downloaded ' + str(size) + ' bytes instead of ' + str(expected) + ', run again to resume')
+    os.replace(part_path, path)
+
+def make_time_chunks(start, end, chunk_ms):
+    # Split [start, end] in consecutive intervals of chunk_ms, the last one may be shorter
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(end, chunk_start + chunk_ms)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+def download_device_video(session, workspace, device_id, chunk, path, args, progress):
+    # Download the video of a device on the chunk interval, only this chunk is downloaded again on failure.
+    # Returns True once downloaded, False on failure, None if a time chunk has no video (404).
+    video_url = 'https://hub.stereolabs.com/api/v1/workspaces/' + workspace + '/devices/' + device_id + '/video/download'
+    video_params = {'start': chunk[0], 'end': chunk[1], 'type': args.format}
+    print('Downloading', path, '...')
+    for retry in range(DOWNLOAD_RETRIES + 1):
+        try:
+            download_video(session, video_url, video_params, path, progress, args.segments)
+            print(path, 'downloaded')
+            progress.video_done()
+            return True
+        except (DownloadError, requests.RequestException, OSError) as e:
+            if args.chunk_minutes > 0 and isinstance(e, DownloadError) and e.status_code == 404:
+                # The device recorded nothing during this time chunk
+                print('No video for', path, 'on device', device_id)
+                progress.video_done()
+                return None
+            print('Unable to get', path, 'on device', device_id, ':', e)
+            if not is_retryable(e):
+                break
+        if retry < DOWNLOAD_RETRIES:
+            time.sleep(2 ** retry)
+    progress.video_failed()
+    return False
+
+def write_manifest(device_id, chunk_results, args):
+    # List the chunks of a device in order, and put them together in a single mp4 when possible
+    manifest = {'device_id': device_id, 'format': args.format, 'start': int(args.start), 'end': int(args.end), 'chunks': []}
+    for (chunk_start, chunk_end), path, downloaded in chunk_results:
+        manifest['chunks'].append({'start': chunk_start, 'end': chunk_end, 'file': path if downloaded is not None else None,
+                                   'downloaded': downloaded is True, 'no_video': downloaded is None})
+    manifest_path = 'video_' + device_id + '.manifest.json'
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    print('Chunks of device', device_id, 'listed in', manifest_path)
+
+    if not args.concat:
+        return
+    if args.format != 'mp4':
+        print('Only mp4 chunks can be concatenated, see', manifest_path, 'for the chunks of device', device_id)
+        return
+    if any(downloaded is False for _, _, downloaded in chunk_results):
+        print('Some chunks of device', device_id, 'are missing, they are not concatenated')
+        return
+    # Chunks without video are skipped
+    chunk_results = [result for result in chunk_results if result[2] is True]
+    if len(chunk_results) == 0:
+        print('No video for device', device_id)
+        return
+    if shutil.which('ffmpeg') is None:
+        print('ffmpeg not found, the chunks of device', device_id, 'are not concatenated')
+        return
+    list_path = 'video_' + device_id + '.chunks.txt'
+    with open(list_path, 'w') as f:
+        for _, path, _ in chunk_results:
+            f.write("file '" + os.path.abspath(path) + "'\n")
+    output_path = 'video_' + device_id + '.mp4'
+    result = subprocess.run(['ffmpeg', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path])
+    os.remove(list_path)
+    if result.returncode == 0:
+        print('Chunks of device', device_id, 'concatenated in', output_path)
+    else:
+        print('Unable to concatenate the chunks of device', device_id)
 
 def main():
     print('Hello ZED')
@@ -31,6 +267,10 @@ def main():
     parser.add_argument("--workspace", help="Workspace ID of the devices", required=True)
     parser.add_argument("--token", help="API token generated at https://hub.stereolabs.com/token", required=True)
     parser.add_argument("--format", help="Video format (default is svo.)", type=str, choices=['svo', 'mp4'], default='svo')
+    parser.add_argument("--workers", help="Number of devices downloaded at the same time (default is 4.)", type=int, default=4)
+    parser.add_argument("--segments", help="Number of ranges of a video downloaded at the same time (default is 1.)", type=int, default=1)
+    parser.add_argument("--chunk_minutes", help="Split the interval in chunks of this duration, downloaded at the same time (default is 0, no split.)", type=float, default=0)
+    parser.add_argument("--concat", help="Concatenate the mp4 chunks of each device with ffmpeg", action='store_true')
     args = parser.parse_args()
 
     print('Retrieving videos from workspace', args.workspace, 'in format', args.format)
@@ -61,22 +301,46 @@ def main():
         end_int = int(args.end)
     except:
         print("Timestamps must be integers. They are", args.start, args.end)
+        exit(1)
 
     start_datetime = datetime.datetime.fromtimestamp(start_int/1000)
     end_datetime = datetime.datetime.fromtimestamp(end_int/1000)
 
     print('Retrieving video from', start_datetime.strftime("%m/%d/%Y, %H:%M:%S"), 'to', end_datetime.strftime("%m/%d/%Y, %H:%M:%S"))
 
-    for device_id in devices_ids:
-        print('Downloading from', device_id, '...')
-        video_url = 'https://hub.stereolabs.com/api/v1/workspaces/' + args.workspace + '/devices/' + device_id + '/video/download'
-        video_params = '?start=' + args.start + '&end=' + args.end + '&type=' + args.format
-        video_get = requests.get(video_url + video_params, headers=headers)
-        
-        if(video_get.status_code == 200):
-            open('video_' + device_id + '.' + args.format, 'wb').write(video_get.content)
-        else:
-            print(video_get.status_code, ': Unable to get this recording on device', device_id)
+    # One pooled session shared by the downloading threads
+    workers = max(1, args.workers)
+    args.segments = max(1, args.segments)
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers * args.segments)
+    session.mount('https://', adapter)
+
+    # Long intervals can be split in time chunks, so that each server-side export stays small
+    if args.chunk_minutes > 0:
+        chunks = make_time_chunks(start_int, end_int, round(args.chunk_minutes * 60 * 1000))
+        print('Interval split in', len(chunks), 'chunks of', args.chunk_minutes, 'minutes')
+    else:
+        chunks = [(start_int, end_int)]
+
+    progress = Progress(len(devices_ids) * len(chunks))
+    jobs = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for device_id in devices_ids:
+            jobs[device_id] = []
+            for chunk in chunks:
+                if len(chunks) > 1:
+                    path = 'video_' + device_id + '_' + str(chunk[0]) + '_' + str(chunk[1]) + '.' + args.format
+                else:
+                    path = 'video_' + device_id + '.' + args.format
+                future = executor.submit(download_device_video, session, args.workspace, device_id, chunk, path, args, progress)
+                jobs[device_id].append((chunk, path, future))
+    progress.stop()
+    session.close()
+
+    if len(chunks) > 1:
+        for device_id in devices_ids:
+            write_manifest(device_id, [(chunk, path, future.result()) for chunk, path, future in jobs[device_id]], args)
 
 if __name__ == "__main__":
     main()
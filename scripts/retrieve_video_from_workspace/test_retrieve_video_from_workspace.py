@@ -0,0 +1,165 @@
+########################################################################
+#
+# Copyright (c) 2022, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_retrieve_video_from_workspace.py
+# Videos are served by a local range-capable HTTP server, no ZED Hub workspace is needed.
+
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from retrieve_video_from_workspace import DownloadError, download_video, is_retryable
+
+VIDEO = bytes(range(256)) * 4001
+
+
+class VideoHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get('Range'))
+        if self.path != '/video/download':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        first, last = 0, len(VIDEO) - 1
+        status = 200
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match is not None:
+            first = int(match.group(1))
+            if match.group(2) != '':
+                last = min(last, int(match.group(2)))
+            if first >= len(VIDEO):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */' + str(len(VIDEO)))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+        body = VIDEO[first:last + 1]
+        self.send_response(status)
+        if status == 206:
+            self.send_header('Content-Range', 'bytes ' + str(first) + '-' + str(last) + '/' + str(len(VIDEO)))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeProgress:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.downloaded_bytes = 0
+
+    def add_bytes(self, size):
+        with self.lock:
+            self.downloaded_bytes += size
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), VideoHandler)
+    server.ranges = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session():
+    session = requests.Session()
+    yield session
+    session.close()
+
+
+def video_url(server):
+    return 'http://127.0.0.1:' + str(server.server_address[1]) + '/video/download'
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_partial_file_is_resumed(server, session, tmp_path):
+    path = str(tmp_path / 'video.svo')
+    with open(path + '.part', 'wb') as f:
+        f.write(VIDEO[:1000])
+    progress = FakeProgress()
+    download_video(session, video_url(server), {}, path, progress)
+    assert read(path) == VIDEO
+    assert not os.path.exists(path + '.part')
+    # Only the missing bytes are requested
+    assert server.ranges == ['bytes=1000-']
+    assert progress.downloaded_bytes == len(VIDEO) - 1000
+
+
+def test_complete_part_file_is_kept_on_416(server, session, tmp_path):
+    path = str(tmp_path / 'video.svo')
+    with open(path + '.part', 'wb') as f:
+        f.write(VIDEO)
+    progress = FakeProgress()
+    download_video(session, video_url(server), {}, path, progress)
+    assert read(path) == VIDEO
+    assert server.ranges == ['bytes=' + str(len(VIDEO)) + '-']
+    assert progress.downloaded_bytes == 0
+
+
+def test_segments_are_assembled_in_order(server, session, tmp_path):
+    path = str(tmp_path / 'video.svo')
+    progress = FakeProgress()
+    download_video(session, video_url(server), {}, path, progress, segments=4)
+    assert read(path) == VIDEO
+    assert sorted(os.listdir(tmp_path)) == ['video.svo']
+    # One request for the size, then one per segment
+    assert server.ranges[0] == 'bytes=0-0'
+    segment_size = -(-len(VIDEO) // 4)
+    assert sorted(server.ranges[1:]) == sorted('bytes=' + str(first) + '-' + str(min(len(VIDEO), first + segment_size) - 1)
+                                               for first in range(0, len(VIDEO), segment_size))
+    assert progress.downloaded_bytes == len(VIDEO)
+
+
+def test_interrupted_segment_is_resumed(server, session, tmp_path):
+    path = str(tmp_path / 'video.svo')
+    segment_size = -(-len(VIDEO) // 4)
+    # The second segment stopped after 10 bytes, the last one is complete
+    with open(path + '.part1', 'wb') as f:
+        f.write(VIDEO[segment_size:segment_size + 10])
+    with open(path + '.part3', 'wb') as f:
+        f.write(VIDEO[3 * segment_size:])
+    download_video(session, video_url(server), {}, path, FakeProgress(), segments=4)
+    assert read(path) == VIDEO
+    assert 'bytes=' + str(segment_size + 10) + '-' + str(2 * segment_size - 1) in server.ranges
+    assert not any(r is not None and r.startswith('bytes=' + str(3 * segment_size)) for r in server.ranges)
+
+
+def test_missing_video_is_not_retryable(server, session, tmp_path):
+    with pytest.raises(DownloadError) as e:
+        download_video(session, video_url(server).replace('/video/download', '/missing'), {}, str(tmp_path / 'video.svo'),
+                       FakeProgress(), segments=2)
+    assert e.value.status_code == 404
+    assert not is_retryable(e.value)
@@ -21,7 +21,58 @@
 import argparse
 import random
 import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+# Latencies and status of the sent telemetry, shared by the sending threads
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = {}
+
+    def add(self, latency, error=None):
+        with self.lock:
+            self.latencies.append(latency)
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+def percentile(sorted_values, p):
+    if len(sorted_values) == 0:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def send_point(session, urls, start_int, end_int, stats):
+    # Random telemetry sent as a random device of the list
+    data = {"label": "people detection", "payload": {}}
+    data["timestamp"] = random.randint(start_int, end_int)
+    data["payload"]["people_count"] = random.randint(1, 5)
+    data["payload"]["accuracy_percent"] = random.randint(80, 99)
+    request_start = time.perf_counter()
+    try:
+        res = session.post(url=random.choice(urls), json=data, timeout=30)
+        error = None if res.ok else res.status_code
+    except requests.RequestException as e:
+        error = type(e).__name__
+    stats.add(time.perf_counter() - request_start, error)
+
+def sender(session, urls, start_int, end_int, stats, next_point, count, rate, send_start):
+    # Each thread takes the next point to send. With a target rate, point i is sent at send_start + i / rate
+    while True:
+        with next_point["lock"]:
+            i = next_point["index"]
+            next_point["index"] += 1
+        if i >= count:
+            return
+        if rate > 0:
+            delay = send_start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        send_point(session, urls, start_int, end_int, stats)
 
 def main():
     # Current timestamp in ms
@@ -29,10 +80,13 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--workspace", help="Workspace ID of the telemetry", required=True)
-    parser.add_argument("--device", help="Device ID of the telemetry", required=True)
+    parser.add_argument("--device", help="Device ID(s) of the telemetry, each point is sent as one of them", nargs="+", required=True)
     parser.add_argument("--token", help="API token generated at https://hub.stereolabs.com/token", required=True)
     parser.add_argument("--start", help="Timestamp of the beginning of the interval to send telemetry, in milliseconds (default: 2 hours ago)", default=now - 7.2E6)
     parser.add_argument("--end", help="Timestamp of the end of the interval to send telemetry, in milliseconds (default: now)", default=now)
+    parser.add_argument("--count", help="Number of telemetry points to send (default: 15)", type=int, default=15)
+    parser.add_argument("--rate", help="Target rate, in points per second (default: 0, as fast as possible)", type=float, default=0)
+    parser.add_argument("--concurrency", help="Number of requests sent at the same time (default: 1)", type=int, default=1)
     args = parser.parse_args()
 
     try:
@@ -40,6 +94,7 @@ def main():
         end_int = int(args.end)
     except:
         print("Timestamps must be integers. They are", args.start, args.end)
+        return
     
     if end_int <= start_int:
         print("The start timestamp must be before the end timestamp")
@@ -48,29 +103,40 @@ def main():
     start_datetime = datetime.fromtimestamp(start_int / 1000)
     end_datetime = datetime.fromtimestamp(end_int / 1000)
     
-    print("Sending telemetry to workspace", args.workspace, "from", start_datetime.strftime("%m/%d/%Y, %H:%M:%S"), "to", end_datetime.strftime("%m/%d/%Y, %H:%M:%S"), "as device", args.device)
+    print("Sending", args.count, "telemetry to workspace", args.workspace, "from", start_datetime.strftime("%m/%d/%Y, %H:%M:%S"), "to", end_datetime.strftime("%m/%d/%Y, %H:%M:%S"), "as devices", args.device)
 
     # Authorization header
     headers = {
         "Authorization": "Bearer " + args.token,
     }
     
-    # Telemetry url
-    url = "https://hub.stereolabs.com/api/v1/workspaces/" + args.workspace + "/devices/" + args.device + "/telemetry"
-    
-    # Data to send
-    data = {"label": "people detection", "payload": {}}
+    # Telemetry url of each device
+    urls = ["https://hub.stereolabs.com/api/v1/workspaces/" + args.workspace + "/devices/" + device + "/telemetry" for device in args.device]
+
+    # One pooled session shared by the sending threads, so that connections are reused
+    concurrency = max(1, args.concurrency)
+    session = requests.Session()
+    session.headers.update(headers)
+    session.mount("https://", HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency))
+
+    stats = Stats()
+    next_point = {"lock": threading.Lock(), "index": 0}
+    send_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(sender, session, urls, start_int, end_int, stats, next_point, args.count, args.rate, send_start)
+    duration = time.perf_counter() - send_start
+    session.close()
 
-    for i in range(15):
-        data["timestamp"] = random.randint(start_int, end_int)
-        data["payload"]["people_count"] = random.randint(1, 5)
-        data["payload"]["accuracy_percent"] = random.randint(80, 99)
-        res = requests.post(url=url, headers=headers, json=data)
-        
-        if res.ok:
-        	print("Request success with code", res.status_code)
-        else:
-        	print("Request fail with code", res.status_code)
+    # Report
+    latencies = sorted(stats.latencies)
+    error_count = sum(stats.errors.values())
+    print("Sent", len(latencies), "points in", round(duration, 2), "s :", round(len(latencies) / duration, 1), "points/s")
+    print("Latency (ms) : p50", round(percentile(latencies, 50) * 1000, 1),
+          ", p90", round(percentile(latencies, 90) * 1000, 1),
+          ", p99", round(percentile(latencies, 99) * 1000, 1),
+          ", max", round(percentile(latencies, 100) * 1000, 1))
+    print("Errors :", error_count, "(" + str(round(100 * error_count / max(1, len(latencies)), 2)) + " %)", stats.errors if error_count > 0 else "")
 
 
 if __name__ == "__main__":
@@ -21,6 +21,12 @@
 import pyzed.sl as sl
 import pyzed.sl_hub as hub
 import time
+from pose_aggregator import PoseAggregator
+
+# Telemetry window in milliseconds, pose fields and statistics sent for each window
+TELEMETRY_INTERVAL = 1000
+TELEMETRY_FIELDS = ("tx", "ty", "tz", "rx", "ry", "rz")
+TELEMETRY_STATISTICS = ("mean", "min", "max")
 
 
 def main():
@@ -59,8 +65,8 @@ def main():
     cam_pose = sl.Pose()
     runtime_parameters = sl.RuntimeParameters()
     runtime_parameters.measure3D_reference_frame = sl.REFERENCE_FRAME.WORLD
-    previous_timestamp = sl.Timestamp()
-    previous_timestamp.set_milliseconds(0)
+    # The pose of every frame is aggregated, one telemetry is sent per window
+    pose_aggregator = PoseAggregator(TELEMETRY_INTERVAL, TELEMETRY_FIELDS, TELEMETRY_STATISTICS)
 
     # Main loop
     while True:
@@ -69,24 +75,14 @@ def main():
         if status_zed != sl.ERROR_CODE.SUCCESS:
             break
 
-        current_timestamp = zed.get_timestamp(sl.TIME_REFERENCE.IMAGE)
-        if current_timestamp.get_milliseconds() >= previous_timestamp.get_milliseconds() + 1000:
-            # Retrieve camera position
-            zed.get_position(cam_pose)
-            translation = cam_pose.get_translation()
-            rot = cam_pose.get_rotation_vector()
-
-            # Send Telemetry
-            position_telemetry = {}
-            position_telemetry["tx"] = translation.get()[0]
-            position_telemetry["ty"] = translation.get()[1]
-            position_telemetry["tz"] = translation.get()[2]
-            position_telemetry["rx"] = rot[0]
-            position_telemetry["ry"] = rot[1]
-            position_telemetry["rz"] = rot[2]
-
-            hub.HubClient.send_telemetry("camera_position", position_telemetry)
-            previous_timestamp = current_timestamp
+        # Retrieve camera position
+        current_timestamp = zed.get_timestamp(sl.TIME_REFERENCE.IMAGE).get_milliseconds()
+        zed.get_position(cam_pose)
+        pose_aggregator.add(current_timestamp, cam_pose.get_translation().get(), cam_pose.get_rotation_vector())
+
+        # Send Telemetry : last pose and statistics of the window
+        if pose_aggregator.is_due(current_timestamp):
+            hub.HubClient.send_telemetry("camera_position", pose_aggregator.summary())
 
         # Insert custom code here
 
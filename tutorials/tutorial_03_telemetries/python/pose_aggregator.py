@@ -0,0 +1,106 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import numpy as np
+
+# Pose fields : translation then rotation vector
+FIELDS = ("tx", "ty", "tz", "rx", "ry", "rz")
+STATISTICS = ("mean", "min", "max")
+
+
+#
+# \brief Aggregates the camera pose of every frame into one telemetry per window.
+# Poses are written in a preallocated ring buffer, a window is summarized when `interval` milliseconds have elapsed:
+# last value of each field (same keys as a single pose telemetry), its statistics ("tx_mean", "tx_min", ...),
+# the length of the path travelled by the camera and its mean and maximum speed, in units per second.
+# If a window has more poses than the buffer capacity, the oldest ones are overwritten and the statistics
+# only cover the last `capacity` poses, the path length is still complete.
+#
+class PoseAggregator:
+    def __init__(self, interval=1000, fields=FIELDS, statistics=STATISTICS, capacity=256):
+        self.interval = interval
+        self.columns = [FIELDS.index(field) for field in fields]
+        self.fields = list(fields)
+        self.statistics = list(statistics)
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.poses = np.zeros((capacity, len(FIELDS)), dtype=np.float64)
+        self.count = 0
+        self.window_start = None
+        # Last pose of the previous sample, for the path length
+        self.previous_timestamp = None
+        self.previous_translation = np.zeros(3)
+        self.path_length = 0.0
+        self.max_speed = 0.0
+
+    #
+    # \brief Add the pose of a frame
+    # timestamp : in milliseconds, translation : 3 values, rotation : rotation vector, 3 values
+    #
+    def add(self, timestamp, translation, rotation):
+        if self.window_start is None:
+            self.window_start = timestamp
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.poses[i, 0:3] = translation
+        self.poses[i, 3:6] = rotation
+        self.count += 1
+
+        if self.previous_timestamp is not None:
+            step = float(np.linalg.norm(self.poses[i, 0:3] - self.previous_translation))
+            self.path_length += step
+            if timestamp > self.previous_timestamp:
+                self.max_speed = max(self.max_speed, step * 1000.0 / (timestamp - self.previous_timestamp))
+        self.previous_timestamp = timestamp
+        self.previous_translation[:] = self.poses[i, 0:3]
+
+    def is_due(self, timestamp):
+        return self.count > 0 and timestamp >= self.window_start + self.interval
+
+    #
+    # \brief Summary of the current window, which is then reset
+    # \return the telemetry as a dict, None if the window has no pose
+    #
+    def summary(self):
+        if self.count == 0:
+            return None
+        size = min(self.count, self.capacity)
+        poses = self.poses[:size, self.columns]
+        last = (self.count - 1) % self.capacity
+
+        telemetry = {}
+        for field, value in zip(self.fields, self.poses[last, self.columns]):
+            telemetry[field] = float(value)
+        for statistic in self.statistics:
+            values = getattr(np, statistic)(poses, axis=0)
+            for field, value in zip(self.fields, values):
+                telemetry[field + "_" + statistic] = float(value)
+        duration = float(self.timestamps[last] - self.window_start) / 1000.0
+        telemetry["path_length"] = self.path_length
+        telemetry["speed"] = self.path_length / duration if duration > 0 else 0.0
+        telemetry["max_speed"] = self.max_speed
+        telemetry["samples"] = self.count
+
+        # The next window starts from the last pose of this one
+        self.count = 0
+        self.window_start = int(self.timestamps[last])
+        self.path_length = 0.0
+        self.max_speed = 0.0
+        return telemetry
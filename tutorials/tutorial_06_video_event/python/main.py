@@ -20,6 +20,12 @@
 
 import pyzed.sl as sl
 import pyzed.sl_hub as hub
+import os
+from video_event import VideoEventSegmenter, send_video_event
+
+# Optional CSV file in which the detection count of every frame is recorded ("timestamp_ms,count" lines),
+# to be replayed offline with replay_video_events.py
+DETECTION_TRACE = os.getenv("DETECTION_TRACE")
 
 
 def main():
@@ -77,11 +83,13 @@ def main():
     object_detection_runtime_params.object_class_filter.append(
         sl.OBJECT_CLASS.PERSON)
 
-    counter_no_detection = 0
     objects = sl.Objects()
-    event_reference = ""
-    first_event_sent = False
-    last_ts = sl.Timestamp()
+    # Let's define a video event as a video on which you can detect someone at least every 10 frames.
+    # If nobody is detected for 10 frames, a new event is defined next time someone is detected.
+    # The event is updated at most every 2 seconds.
+    segmenter = VideoEventSegmenter(min_detections=1, end_frames=10, update_interval=2000)
+    event_label = "People detection"
+    trace = open(DETECTION_TRACE, "a") if DETECTION_TRACE else None
 
     # Main loop
     while True:
@@ -92,47 +100,26 @@ def main():
         zed.retrieve_objects(objects, object_detection_runtime_params)
 
         #----------     Define event   ----------
-        # Let's define a video event as a video on which you can detect someone at least every 10 frames.
-        # If nobody is detected for 10 frames, a new event is defined next time someone is detected.
-        # Cf README.md to understand how to use the event_reference to define a new event.
-
-        current_ts = objects.timestamp
-        if len(objects.object_list) >= 1 and (current_ts.get_seconds() - last_ts.get_seconds() >= 2):
-            new_event = True
-            if counter_no_detection >= 10 or not first_event_sent:
-                event_reference = "detected_person_" + \
-                    str(current_ts.get_milliseconds())
-            else:
-                new_event = False
-
-            event_params = hub.EventParameters()
-            event_params.timestamp = current_ts.get_milliseconds()
-            event_params.reference = event_reference
-            event_label = "People detection"
+        # Cf README.md to understand how to use the event reference to define a new event.
+        current_ts = objects.timestamp.get_milliseconds()
+        nb_detected_person = len(objects.object_list)
+        if trace is not None:
+            trace.write(str(current_ts) + "," + str(nb_detected_person) + "\n")
+
+        transition = segmenter.process(current_ts, nb_detected_person)
+        if transition is not None:
             event_to_send = {}
-            event_to_send["message"] = "Current event as reference : " + \
-                str(event_reference)
-            event_to_send["nb_detected_person"] = len(objects.object_list)
-
-            if new_event or not first_event_sent:
-                hub.HubClient.start_video_event(
-                    zed, event_label, event_to_send)
-                first_event_sent = True
-                print("Event started")
-            else:
-                hub.HubClient.update_video_event(
-                    zed, event_label, event_to_send)
-                print("Event updated")
-
-            counter_no_detection = 0
-            last_ts = current_ts
-
-        elif current_ts.get_seconds() - last_ts.get_seconds() >= 2:
-            counter_no_detection = counter_no_detection + 1
+            event_to_send["message"] = "Current event as reference : " + transition.reference
+            event_to_send["nb_detected_person"] = nb_detected_person
+            send_video_event(zed, event_label, transition, event_to_send)
+            print("Event", transition.kind, ":", transition.reference)
 
         # In the end of a grab(), always call a update() on the cloud.
         hub.HubClient.update(zed)
 
+    if trace is not None:
+        trace.close()
+
     # Handling camera error
     if status_zed != sl.ERROR_CODE.SUCCESS:
         hub.HubClient.send_log("Grab failed, restarting camera. " + str(status_zed),
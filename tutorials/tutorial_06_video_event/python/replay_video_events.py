@@ -0,0 +1,113 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import argparse
+import json
+import random
+import time
+from video_event import VideoEventSegmenter, START, UPDATE, END
+
+
+# Trace of "timestamp_ms,count" lines, as recorded by main.py with DETECTION_TRACE
+def load_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line == "":
+                continue
+            timestamp, count = line.split(",")
+            trace.append((int(timestamp), int(count)))
+    return trace
+
+
+#
+# \brief People passing in front of the camera at `fps`, with detections flickering off `miss_rate` of the frames
+#
+def synthetic_trace(frames, fps=30, miss_rate=0.1, seed=0):
+    rng = random.Random(seed)
+    trace = []
+    present = 0
+    for i in range(frames):
+        if present == 0 and rng.random() < 0.005:
+            present = rng.randint(1, 3)
+        elif present > 0 and rng.random() < 0.003:
+            present = 0
+        count = present if rng.random() >= miss_rate else 0
+        trace.append((int(i * 1000 / fps), count))
+    return trace
+
+
+def replay(trace, segmenter):
+    transitions = []
+    start = time.perf_counter()
+    for timestamp, count in trace:
+        transition = segmenter.process(timestamp, count)
+        if transition is not None:
+            transitions.append(transition)
+    transition = segmenter.finish(trace[-1][0])
+    if transition is not None:
+        transitions.append(transition)
+    return transitions, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", help="Detection trace to replay, synthetic if not set", default="")
+    parser.add_argument("--frames", help="Number of frames of the synthetic trace", type=int, default=100000)
+    parser.add_argument("--min_detections", type=int, default=1)
+    parser.add_argument("--start_frames", help="Frames with detections needed to start an event", type=int, default=1)
+    parser.add_argument("--end_frames", help="Frames without detection ending an event", type=int, default=10)
+    parser.add_argument("--min_gap", help="Minimum time between two events, in ms", type=int, default=0)
+    parser.add_argument("--update_interval", help="Minimum time between two updates, in ms", type=int, default=2000)
+    parser.add_argument("--save", help="Save the transitions in this JSON file", default="")
+    parser.add_argument("--expected", help="Compare the transitions with the ones saved in this JSON file", default="")
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace) if args.trace != "" else synthetic_trace(args.frames)
+    if len(trace) == 0:
+        print("Empty trace")
+        exit(1)
+    segmenter = VideoEventSegmenter(args.min_detections, args.start_frames, args.end_frames, args.min_gap, args.update_interval)
+    transitions, duration = replay(trace, segmenter)
+
+    trace_duration = max((trace[-1][0] - trace[0][0]) / 1000.0, 1e-3)
+    counts = {kind: len([t for t in transitions if t.kind == kind]) for kind in (START, UPDATE, END)}
+    print(len(trace), "frames,", round(trace_duration), "s of trace")
+    print("events started  :", counts[START], ", updates :", counts[UPDATE], ", ended :", counts[END])
+    print("ZED Hub calls   :", round((counts[START] + counts[UPDATE]) / trace_duration * 60, 2), "per minute")
+    print("processing time :", round(duration / len(trace) * 1e6, 3), "us per frame")
+
+    records = [list(transition) for transition in transitions]
+    if args.save != "":
+        with open(args.save, "w") as f:
+            json.dump(records, f)
+    if args.expected != "":
+        with open(args.expected) as f:
+            expected = json.load(f)
+        if expected != records:
+            mismatch = next((i for i in range(min(len(expected), len(records))) if expected[i] != records[i]), min(len(expected), len(records)))
+            print("Transitions differ from", args.expected, "at transition", mismatch)
+            exit(1)
+        print("Transitions match", args.expected)
+
+
+if __name__ == "__main__":
+    main()
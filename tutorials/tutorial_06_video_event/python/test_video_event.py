@@ -0,0 +1,126 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_video_event.py
+# The ZED SDK is not needed : traces are replayed offline, ZED Hub is a fake module.
+
+import os
+import subprocess
+import sys
+import types
+
+from replay_video_events import load_trace, replay, synthetic_trace
+from video_event import END, START, UPDATE, VideoEventSegmenter, VideoEventTransition, send_video_event
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# A frame every 100 ms : someone shows up with a one frame flicker, leaves, then two people pass by until the end
+COUNTS = [0] * 3 + [1] * 5 + [0] + [1] * 6 + [0] * 15 + [2] * 5
+EXPECTED = [
+    VideoEventTransition(START, "detected_person_400", 400, 1),
+    VideoEventTransition(UPDATE, "detected_person_400", 900, 1),
+    VideoEventTransition(UPDATE, "detected_person_400", 1400, 1),
+    VideoEventTransition(END, "detected_person_400", 2400, 0),
+    VideoEventTransition(START, "detected_person_3100", 3100, 2),
+    VideoEventTransition(END, "detected_person_3100", 3400, 0),
+]
+
+
+def write_trace(path):
+    # Same format as the DETECTION_TRACE of main.py
+    with open(path, "w") as f:
+        for i, count in enumerate(COUNTS):
+            f.write(str(i * 100) + "," + str(count) + "\n")
+
+
+def test_recorded_trace_is_split_in_events(tmp_path):
+    path = str(tmp_path / "trace.csv")
+    write_trace(path)
+    trace = load_trace(path)
+    assert len(trace) == len(COUNTS)
+    transitions, duration = replay(trace, VideoEventSegmenter(start_frames=2, end_frames=10, update_interval=500))
+    assert transitions == EXPECTED
+
+
+def test_min_gap_delays_the_next_event():
+    trace = [(i * 100, count) for i, count in enumerate(COUNTS)]
+    transitions, duration = replay(trace, VideoEventSegmenter(start_frames=2, end_frames=10, min_gap=1000, update_interval=500))
+    # The second event may not start before 2400 + 1000 ms
+    assert transitions[:4] == EXPECTED[:4]
+    assert transitions[4:] == [VideoEventTransition(START, "detected_person_3400", 3400, 2),
+                               VideoEventTransition(END, "detected_person_3400", 3400, 0)]
+
+
+def test_synthetic_trace_events_are_well_formed():
+    transitions, duration = replay(synthetic_trace(20000), VideoEventSegmenter(update_interval=2000))
+    active = None
+    last_update = None
+    for transition in transitions:
+        if transition.kind == START:
+            assert active is None
+            active = transition.reference
+            last_update = transition.timestamp
+        else:
+            assert transition.reference == active
+            if transition.kind == UPDATE:
+                assert transition.timestamp >= last_update + 2000
+                last_update = transition.timestamp
+            else:
+                active = None
+    assert active is None
+    assert len([t for t in transitions if t.kind == START]) > 0
+
+
+def test_replay_script_runs_without_the_sdk(tmp_path):
+    trace = str(tmp_path / "trace.csv")
+    saved = str(tmp_path / "transitions.json")
+    write_trace(trace)
+    script = os.path.join(DIRECTORY, "replay_video_events.py")
+    common = [sys.executable, script, "--trace", trace, "--start_frames", "2", "--update_interval", "500"]
+    # pyzed is hidden from the replay, as on a machine without the ZED SDK
+    env = dict(os.environ, PYTHONPATH=str(tmp_path))
+    (tmp_path / "pyzed").mkdir()
+    (tmp_path / "pyzed" / "__init__.py").write_text("raise ImportError('no ZED SDK')\n")
+    subprocess.run(common + ["--save", saved], check=True, env=env, capture_output=True)
+    result = subprocess.run(common + ["--expected", saved], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    result = subprocess.run(common + ["--end_frames", "3", "--expected", saved], env=env, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "Transitions differ" in result.stdout
+
+
+def test_only_start_and_update_are_sent(monkeypatch):
+    calls = []
+
+    class EventParameters:
+        pass
+
+    hub = types.ModuleType("pyzed.sl_hub")
+    hub.EventParameters = EventParameters
+    hub.HubClient = types.SimpleNamespace(
+        start_video_event=lambda zed, label, data, params: calls.append(("start", params.reference, params.timestamp)),
+        update_video_event=lambda zed, label, data, params: calls.append(("update", params.reference, params.timestamp)))
+    pyzed = types.ModuleType("pyzed")
+    pyzed.sl_hub = hub
+    monkeypatch.setitem(sys.modules, "pyzed", pyzed)
+    monkeypatch.setitem(sys.modules, "pyzed.sl_hub", hub)
+    for transition in EXPECTED:
+        send_video_event(None, "People Detection", transition, {})
+    assert calls == [(t.kind, t.reference, t.timestamp) for t in EXPECTED if t.kind != END]
@@ -0,0 +1,158 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger("multi_stream_tutorial.encoder_scheduler")
+
+# Camera video mode, `resolution` is the name of a sl.RESOLUTION
+VideoMode = namedtuple("VideoMode", ["resolution", "width", "height", "fps"])
+
+# Video modes from the best to the cheapest to encode, a camera is downgraded one step at a time
+DEFAULT_MODES = [
+    VideoMode("HD2K", 2208, 1242, 15),
+    VideoMode("HD1080", 1920, 1080, 15),
+    VideoMode("HD720", 1280, 720, 30),
+    VideoMode("HD720", 1280, 720, 15),
+]
+
+# What a camera is allowed to do : stream (one encoder session), record (a second one), and in which mode
+Assignment = namedtuple("Assignment", ["serial_number", "stream", "record", "mode"])
+
+CameraRequest = namedtuple("CameraRequest", ["serial_number", "priority", "record"])
+
+
+def pixel_rate(mode):
+    return mode.width * mode.height * mode.fps
+
+
+#
+# \brief Whether a camera running with the `current` assignment has to be re-opened to apply the `new` one.
+# Only a change of stream or video mode needs it. A recording change alone is applied the next time the camera
+# is opened, so that a camera flapping in and out of the schedule does not restart the healthy ones.
+#
+def needs_restart(current, new):
+    if current is None or new is None:
+        return current != new
+    return new.stream != current.stream or new.mode != current.mode
+
+
+#
+# \brief Share a budget of hardware encoder sessions, and optionally of encoded pixels per second, between cameras.
+# Every camera streams by default. Cameras are served by decreasing priority : each one gets a streaming session,
+# then the sessions left are used for recording. While the pixel rate is over budget, the recordings of the lowest
+# priority cameras are dropped first, then their video mode walks down the ladder one step at a time. A stream is
+# refused, and logged, only when the cheapest mode of every camera still does not fit, or when there are more cameras
+# than `sessions`. The assignments are computed again whenever a camera is added or removed, so that the budget of
+# a camera dropping out goes to the other cameras.
+#
+class EncoderScheduler:
+    # sessions : number of concurrent encoder sessions (consumer NVIDIA GPUs are limited to a few), None for no limit
+    # max_pixel_rate : encoded pixels per second over all the sessions, None for no limit
+    # on_change : function({serial_number: Assignment or None}) called with the assignments that changed
+    def __init__(self, sessions=None, max_pixel_rate=None, modes=DEFAULT_MODES, on_change=None):
+        self.sessions = sessions
+        self.max_pixel_rate = max_pixel_rate
+        self.modes = list(modes)
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.cameras = {}
+        self.assignments = {}
+        # Cameras without streaming session
+        self.refused = set()
+
+    def add_camera(self, serial_number, priority=0, record=True):
+        with self.lock:
+            self.cameras[serial_number] = CameraRequest(serial_number, priority, record)
+            changes = self.update()
+        self.notify(changes)
+
+    def remove_camera(self, serial_number):
+        with self.lock:
+            self.cameras.pop(serial_number, None)
+            changes = self.update()
+        self.notify(changes)
+
+    #
+    # \return the Assignment of the camera, None if it has no encoder session
+    #
+    def assignment(self, serial_number):
+        with self.lock:
+            return self.assignments.get(serial_number)
+
+    def notify(self, changes):
+        if self.on_change is not None and len(changes) > 0:
+            self.on_change(changes)
+
+    def update(self):
+        assignments = self.schedule()
+        changes = {}
+        for serial_number in set(self.assignments) | set(assignments):
+            if self.assignments.get(serial_number) != assignments.get(serial_number):
+                changes[serial_number] = assignments.get(serial_number)
+        self.assignments = assignments
+        refused = set(self.cameras) - set(assignments)
+        for serial_number in sorted(refused - self.refused, key=str):
+            logger.warning("No encoder budget left to stream camera %s, it waits for another camera to release one", serial_number)
+        self.refused = refused
+        return changes
+
+    def schedule(self):
+        cameras = sorted(self.cameras.values(), key=lambda camera: (-camera.priority, str(camera.serial_number)))
+        streaming = cameras if self.sessions is None else cameras[:self.sessions]
+        while True:
+            assignments = self.fit(streaming)
+            if assignments is not None:
+                return assignments
+            # Even the cheapest modes are over budget : the lowest priority camera does not stream
+            streaming = streaming[:-1]
+
+    #
+    # \brief Recordings and video modes of `streaming` (by decreasing priority) within the budget
+    # \return {serial_number: Assignment}, None if the cameras do not fit even in the cheapest mode without recording
+    #
+    def fit(self, streaming):
+        sessions_left = None if self.sessions is None else self.sessions - len(streaming)
+        recording = []
+        for camera in streaming:
+            if camera.record and (sessions_left is None or sessions_left > 0):
+                recording.append(camera.serial_number)
+                if sessions_left is not None:
+                    sessions_left -= 1
+        levels = {camera.serial_number: 0 for camera in streaming}
+
+        def total_pixel_rate():
+            return sum([pixel_rate(self.modes[levels[camera.serial_number]]) * (2 if camera.serial_number in recording else 1)
+                        for camera in streaming])
+
+        while self.max_pixel_rate is not None and total_pixel_rate() > self.max_pixel_rate:
+            downgradable = [camera for camera in streaming if levels[camera.serial_number] < len(self.modes) - 1]
+            if len(recording) > 0:
+                recording.pop()
+            elif len(downgradable) > 0:
+                levels[downgradable[-1].serial_number] += 1
+            else:
+                return None
+
+        return {camera.serial_number: Assignment(camera.serial_number, True, camera.serial_number in recording,
+                                                 self.modes[levels[camera.serial_number]])
+                for camera in streaming}
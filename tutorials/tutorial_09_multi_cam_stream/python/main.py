@@ -21,35 +21,249 @@
 
 import pyzed.sl as sl
 import pyzed.sl_hub as hub
+import logging
+import queue
 import threading
 import time
+from encoder_scheduler import EncoderScheduler, needs_restart
+from hub_logging import setup_hub_logging
 
-run_zeds = True
-zeds = []
+# Delay before reopening a failed camera, doubled after each failure
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+# A camera streaming for this long without failure gets back to the shortest restart delay
+STABLE_DURATION = 60.0
+# Period of the camera health telemetry, in seconds
+METRICS_PERIOD = 10.0
 
-# Streams' loop to grab image
-def stream_loop(zed : sl.Camera):
-    global run_zeds
+# Hardware encoder budget. On Ubuntu desktop, on consumer-level GPUs, you don't have enough hardware encoder to stream
+# multiple devices and to record at the same time. https://en.wikipedia.org/wiki/Nvidia_NVENC
+# Every camera streams, recordings are dropped and video modes lowered to stay within the pixel rate.
+# Set ENCODER_SESSIONS to the number of sessions of your GPU to also cap them. On Jetsons or on business-grade gpus,
+# raise the pixel rate (None for no limit).
+ENCODER_SESSIONS = None
+ENCODER_PIXEL_RATE = 125000000  # encoded pixels per second, about 2 x HD2K@15 streamed and recorded
 
-    zed_image = sl.Mat(1280, 720, sl.MAT_TYPE.U8_C4)
+logger = logging.getLogger("multi_stream_tutorial")
 
-    while run_zeds:
+# Registration to ZED Hub is done by one camera at a time, opening the cameras is done in parallel
+register_lock = threading.Lock()
+
+# A preallocated sl.Mat and the numpy array sharing its memory (get_data with deep_copy = False)
+class FrameBuffer:
+    def __init__(self, width, height):
+        self.mat = sl.Mat(width, height, sl.MAT_TYPE.U8_C4)
+        self.data = self.mat.get_data(sl.MEM.CPU, False)
+
+# Ring of frame buffers, handed from the capture thread to the upload thread without copy.
+# A buffer has a single owner at a time : acquire() hands a free buffer to the capture thread,
+# which passes it on to the upload thread, which gives it back with release() once the frame is uploaded.
+class FramePool:
+    def __init__(self, size=2, width=1280, height=720):
+        self.free = queue.Queue()
+        for _ in range(size):
+            self.free.put(FrameBuffer(width, height))
+
+    # Blocks until a buffer is released if they are all in use
+    def acquire(self):
+        return self.free.get()
+
+    def release(self, buffer):
+        self.free.put(buffer)
+
+# Per-camera health counters, updated by the grab and upload threads and reported by the main thread
+class CameraMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.grab_time = 0.0
+        self.upload_time = 0.0
+        self.uploads = 0
+        self.restarts = 0
+        self.last_report = time.monotonic()
+
+    def add_grab(self, duration):
+        with self.lock:
+            self.frames += 1
+            self.grab_time += duration
+
+    def add_upload(self, duration):
+        with self.lock:
+            self.uploads += 1
+            self.upload_time += duration
+
+    def add_restart(self):
+        with self.lock:
+            self.restarts += 1
+
+    # FPS and mean latencies (ms) since the previous report
+    def report(self):
+        now = time.monotonic()
+        with self.lock:
+            elapsed = max(now - self.last_report, 1e-6)
+            report = {
+                "fps": round(self.frames / elapsed, 2),
+                "grab_latency_ms": round(self.grab_time / self.frames * 1000, 2) if self.frames > 0 else 0.0,
+                "upload_latency_ms": round(self.upload_time / self.uploads * 1000, 2) if self.uploads > 0 else 0.0,
+                "restarts": self.restarts,
+            }
+            self.frames = 0
+            self.grab_time = 0.0
+            self.uploads = 0
+            self.upload_time = 0.0
+            self.last_report = now
+        return report
+
+# Upload loop of a stream, fed by its grab loop.
+# The camera is not thread safe : update() only runs while the grab loop does not use the camera (zed_lock).
+def upload_loop(zed : sl.Camera, zed_lock : threading.Lock, pool : FramePool, frames : queue.Queue, metrics : CameraMetrics):
+    while True:
+        buffer = frames.get()
+        if buffer is None:
+            break
+        with zed_lock:
+            start = time.perf_counter()
+            hub.HubClient.update(zed, buffer.mat)
+            metrics.add_upload(time.perf_counter() - start)
+        pool.release(buffer)
+
+# Streams' loop to grab image, until a grab fails or the worker is interrupted
+def stream_loop(zed : sl.Camera, interrupted : threading.Event, metrics : CameraMetrics):
+    # The upload thread only decouples the handoff of a frame from the grab loop. Every call on the camera
+    # (grab, retrieve_image and update) is made under zed_lock, so grabbing and uploading never overlap and a camera
+    # does not stream faster than with a single loop. With a second buffer, the next grab waits for the lock only,
+    # not for the upload thread to give its buffer back.
+    pool = FramePool(2)
+    frames = queue.Queue(maxsize=1)
+    zed_lock = threading.Lock()
+    upload_thread = threading.Thread(target=upload_loop, args=(zed, zed_lock, pool, frames, metrics))
+    upload_thread.start()
+
+    status_zed = sl.ERROR_CODE.SUCCESS
+    while not interrupted.is_set():
         # grab current image
-        if zed.grab() == sl.ERROR_CODE.SUCCESS:
-            zed.retrieve_image(zed_image, sl.VIEW.LEFT, sl.MEM.CPU, zed_image.get_resolution())
-            hub.HubClient.update(zed, zed_image)
-        else:
-            run_zeds = False
+        buffer = pool.acquire()
+        with zed_lock:
+            start = time.perf_counter()
+            status_zed = zed.grab()
+            if status_zed == sl.ERROR_CODE.SUCCESS:
+                metrics.add_grab(time.perf_counter() - start)
+                zed.retrieve_image(buffer.mat, sl.VIEW.LEFT, sl.MEM.CPU, buffer.mat.get_resolution())
+        if status_zed != sl.ERROR_CODE.SUCCESS:
+            pool.release(buffer)
+            break
+        frames.put(buffer)
 
-def main():
-    global run_zeds
+    frames.put(None)
+    upload_thread.join()
+    return status_zed
+
+# One camera, opened, registered and streamed by its own thread, in the video mode and with the recording
+# decided by the encoder scheduler. A camera without encoder budget waits for another camera to release some.
+# A camera that fails to open or to grab releases its sessions, and is reopened after a delay growing with
+# consecutive failures, without affecting the other cameras.
+class CameraWorker:
+    def __init__(self, serial_number, scheduler, priority=0):
+        self.serial_number = serial_number
+        self.scheduler = scheduler
+        self.priority = priority
+        self.zed = sl.Camera()
+        self.metrics = CameraMetrics()
+        self.stopped = threading.Event()
+        # Set when the worker is stopped or its assignment changed enough to re-open the camera, interrupts the streaming
+        self.wakeup = threading.Event()
+        # Assignment the camera is opened with, None while it waits for one or is closed
+        self.lock = threading.Lock()
+        self.running = None
+        self.thread = threading.Thread(target=self.run)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+    def on_assignment_changed(self, assignment):
+        with self.lock:
+            if needs_restart(self.running, assignment):
+                self.wakeup.set()
+
+    def join(self):
+        self.thread.join()
 
+    def open(self, assignment):
+        init_params = sl.InitParameters()
+        init_params.camera_resolution = getattr(sl.RESOLUTION, assignment.mode.resolution)
+        init_params.camera_fps = assignment.mode.fps
+        init_params.depth_mode = sl.DEPTH_MODE.NONE
+        init_params.set_from_serial_number(self.serial_number)
+        err = self.zed.open(init_params)
+        if err != sl.ERROR_CODE.SUCCESS:
+            return "open failed: " + str(err)
+        cam_info = self.zed.get_camera_information()
+        print("serial number:", cam_info.serial_number, ", model:", cam_info.camera_model, ", status: opened,",
+              assignment.mode.resolution, "@", assignment.mode.fps, "fps, recording:", assignment.record)
+
+        # Register the camera once it's open, recording only if the scheduler gave it an encoder session for it
+        updateParameters = hub.UpdateParameters()
+        updateParameters.enable_recording = assignment.record
+        with register_lock:
+            status_hub = hub.HubClient.register_camera(self.zed, updateParameters)
+        if status_hub != hub.STATUS_CODE.SUCCESS:
+            return "registration failed: " + str(status_hub)
+        return None
+
+    def run(self):
+        delay = RESTART_DELAY
+        while not self.stopped.is_set():
+            with self.lock:
+                self.wakeup.clear()
+                assignment = self.scheduler.assignment(self.serial_number)
+                self.running = assignment
+            if assignment is None:
+                print("No encoder budget left for zed", self.serial_number, ", waiting")
+                self.wakeup.wait()
+                continue
+
+            started = time.monotonic()
+            error = self.open(assignment)
+            if error is None:
+                print("Streaming zed", self.serial_number)
+                status_zed = stream_loop(self.zed, self.wakeup, self.metrics)
+                if status_zed != sl.ERROR_CODE.SUCCESS:
+                    error = "grab failed: " + str(status_zed)
+            self.zed.close()
+            with self.lock:
+                self.running = None
+            if error is None:
+                # Stopped, or reopened with its new assignment
+                continue
+
+            if time.monotonic() - started > STABLE_DURATION:
+                delay = RESTART_DELAY
+            print("Camera", self.serial_number, error, ", restarting in", delay, "s")
+            # Rate limited : a camera failing in a loop does not flood ZED Hub with its restarts
+            logger.error("Camera %s %s, restarting in %ss", self.serial_number, error, delay)
+            self.metrics.add_restart()
+            # Give the encoder sessions to the other cameras until restarting
+            self.scheduler.remove_camera(self.serial_number)
+            if self.stopped.wait(delay):
+                break
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+            self.scheduler.add_camera(self.serial_number, self.priority)
+        self.scheduler.remove_camera(self.serial_number)
+
+def main():
     # Initialize the communication to ZED Hub
     status_hub = hub.HubClient.connect("multi_stream_tutorial")
     if status_hub != hub.STATUS_CODE.SUCCESS:
         print("Initialization error ", status_hub)
         exit(1)
 
+    # Logs are sent to ZED Hub from a background thread, rate limited per message
+    log_handler = setup_hub_logging(logger)
+
     # Get detected cameras
     devList = sl.Camera.get_device_list()
     nb_detected_zed = len(devList)
@@ -60,54 +274,42 @@ def main():
     
     print(nb_detected_zed, "ZED detected")
 
-    init_params = sl.InitParameters()
-    init_params.camera_resolution = sl.RESOLUTION.HD2K
-    init_params.camera_fps = 30
-    init_params.depth_mode = sl.DEPTH_MODE.NONE
-    
-    # Open every detected cameras
-    for i in range(nb_detected_zed):
-        init_params.set_from_camera_id(i)
-        zed = sl.Camera()
-        zeds.append(zed)
-        err = zed.open(init_params)
-
-        if err == sl.ERROR_CODE.SUCCESS:
-            cam_info = zed.get_camera_information()
-            print("serial number:", cam_info.serial_number, ", model:", cam_info.camera_model, ", status: opened")
-        else:
-            print("Error on camera", i, ":", err )
-            zed.close()
-    
-        # Register the camera once it's open
-        updateParameters = hub.UpdateParameters()
+    # Open and stream every detected camera, each one from its own thread.
+    # The first detected cameras have the highest priority for the encoder sessions.
+    workers_by_serial = {}
+    def on_assignments_changed(changes):
+        for serial_number, assignment in changes.items():
+            workers_by_serial[serial_number].on_assignment_changed(assignment)
+    scheduler = EncoderScheduler(ENCODER_SESSIONS, ENCODER_PIXEL_RATE, on_change=on_assignments_changed)
+    workers = [CameraWorker(devList[i].serial_number, scheduler, nb_detected_zed - i) for i in range(nb_detected_zed)]
+    # All cameras are known to the scheduler before they start, so that they are opened once with their final assignment
+    for worker in workers:
+        workers_by_serial[worker.serial_number] = worker
+        scheduler.add_camera(worker.serial_number, worker.priority)
+    for worker in workers:
+        print("Starting a thread for zed", worker.serial_number)
+        worker.start()
+
+    # Health loop : FPS, grab and upload latencies of every camera
+    try:
+        while any([worker.thread.is_alive() for worker in workers]):
+            time.sleep(METRICS_PERIOD)
+            for worker in workers:
+                report = worker.metrics.report()
+                report["serial_number"] = worker.serial_number
+                print(report)
+                hub.HubClient.send_telemetry("camera_health", report)
+    except KeyboardInterrupt:
+        pass
 
-        # On Ubuntu desktop, on consumer-level GPUs, you don't have enough hardware encoder to stream multiple devices
-        # and to record at the same time. https://en.wikipedia.org/wiki/Nvidia_NVENC
-        # On Jetsons or on business-grade gpus, you can do whatever you want.
-        updateParameters.enable_recording = False
-        status_hub = hub.HubClient.register_camera(zeds[i], updateParameters)
-        if status_hub != hub.STATUS_CODE.SUCCESS:
-            print("Camera registration error ", status_hub)
-            exit(1)
-    
-    # Thread loops for all streams
-    thread_pool = {}
-    for zed in zeds:
-        if zed.is_opened():
-            print("Starting a thread for zed", i, zed.get_camera_information().serial_number)
-            thread_pool[zed] = threading.Thread(target=stream_loop, args=(zed,))
-            thread_pool[zed].start()
-    
-    # Idle loop
-    while run_zeds:
-        time.sleep(1)
-    
     # Wait for every thread to be stopped
-    for zed in zeds:
-        if zed.is_opened():
-            thread_pool[zed].join()
-            zed.close()
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.join()
+
+    # Send the pending logs before disconnecting
+    log_handler.close()
 
     # Close the communication with ZED Hub properly.
     status_hub = hub.HubClient.disconnect()
@@ -0,0 +1,153 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_encoder_scheduler.py
+# The scheduler has no ZED SDK dependency, it is driven with a fake registry of cameras.
+
+import logging
+
+from encoder_scheduler import DEFAULT_MODES, Assignment, EncoderScheduler, needs_restart, pixel_rate
+
+HD2K, HD1080, HD720_30, HD720_15 = DEFAULT_MODES
+
+# The budget of main.py
+PIXEL_RATE = 125000000
+
+
+# Cameras of the machine as the workers see them : the assignment each one runs with,
+# and how many times it had to be re-opened to apply a new one
+class FakeRegistry:
+    def __init__(self):
+        self.running = {}
+        self.restarts = {}
+        self.notifications = []
+
+    def on_change(self, changes):
+        self.notifications.append(changes)
+        for serial_number, assignment in changes.items():
+            if needs_restart(self.running.get(serial_number), assignment):
+                self.restarts[serial_number] = self.restarts.get(serial_number, 0) + 1
+            self.running[serial_number] = assignment
+
+    def streaming(self):
+        return sorted([serial_number for serial_number, assignment in self.running.items() if assignment is not None])
+
+
+def add_cameras(scheduler, count, record=True):
+    # The first camera has the highest priority, as in main.py
+    for i in range(count):
+        scheduler.add_camera(i, count - i, record)
+
+
+def total_pixel_rate(scheduler):
+    return sum([pixel_rate(a.mode) * (2 if a.record else 1) for a in scheduler.assignments.values()])
+
+
+def test_every_camera_streams_by_default():
+    registry = FakeRegistry()
+    scheduler = EncoderScheduler(on_change=registry.on_change)
+    add_cameras(scheduler, 8)
+    assert registry.streaming() == list(range(8))
+    assert all(scheduler.assignment(i) == (i, True, True, HD2K) for i in range(8))
+
+
+def test_every_camera_streams_within_the_default_pixel_rate():
+    registry = FakeRegistry()
+    scheduler = EncoderScheduler(None, PIXEL_RATE, on_change=registry.on_change)
+    add_cameras(scheduler, 8)
+    assert registry.streaming() == list(range(8))
+    assert total_pixel_rate(scheduler) <= PIXEL_RATE
+    assert scheduler.refused == set()
+
+
+def test_recordings_are_dropped_before_any_downgrade():
+    scheduler = EncoderScheduler(None, 3 * pixel_rate(HD2K))
+    add_cameras(scheduler, 2)
+    # 2 streams and 1 recording in HD2K fit, the lowest priority camera loses its recording first
+    assert scheduler.assignment(0) == (0, True, True, HD2K)
+    assert scheduler.assignment(1) == (1, True, False, HD2K)
+
+
+def test_lowest_priority_cameras_are_downgraded_first():
+    scheduler = EncoderScheduler(None, 2 * pixel_rate(HD2K) + pixel_rate(HD720_15))
+    add_cameras(scheduler, 3)
+    assert [scheduler.assignment(i).mode for i in range(3)] == [HD2K, HD2K, HD720_15]
+    assert not any(scheduler.assignment(i).record for i in range(3))
+    # One more camera : the next one walks down the ladder, step by step
+    scheduler.add_camera(3, 0)
+    modes = [scheduler.assignment(i).mode for i in range(4)]
+    assert modes[0] == HD2K
+    assert modes[2:] == [HD720_15, HD720_15]
+    assert total_pixel_rate(scheduler) <= scheduler.max_pixel_rate
+
+
+def test_stream_is_refused_only_when_the_cheapest_mode_does_not_fit(caplog):
+    registry = FakeRegistry()
+    scheduler = EncoderScheduler(None, 3 * pixel_rate(HD720_15), on_change=registry.on_change)
+    with caplog.at_level(logging.WARNING, logger="multi_stream_tutorial"):
+        add_cameras(scheduler, 3)
+        assert registry.streaming() == [0, 1, 2]
+        assert caplog.records == []
+        scheduler.add_camera(3, 0)
+    assert registry.streaming() == [0, 1, 2]
+    assert scheduler.assignment(3) is None
+    assert [record.getMessage() for record in caplog.records] == [
+        "No encoder budget left to stream camera 3, it waits for another camera to release one"]
+
+
+def test_sessions_are_given_back_when_a_camera_is_removed():
+    registry = FakeRegistry()
+    scheduler = EncoderScheduler(3, on_change=registry.on_change)
+    add_cameras(scheduler, 4)
+    # 3 sessions : 3 streams, no recording, the 4th camera waits
+    assert registry.streaming() == [0, 1, 2]
+    assert not any(registry.running[i].record for i in range(3))
+    scheduler.remove_camera(1)
+    assert registry.streaming() == [0, 2, 3]
+    assert registry.notifications[-1] == {1: None, 3: (3, True, False, HD2K)}
+    scheduler.remove_camera(2)
+    # A session is left for the highest priority camera to record
+    assert scheduler.assignment(0).record
+    scheduler.add_camera(1, 3)
+    assert registry.streaming() == [0, 1, 3]
+    assert not scheduler.assignment(0).record
+
+
+def test_recording_change_alone_does_not_restart_a_camera():
+    registry = FakeRegistry()
+    scheduler = EncoderScheduler(3, on_change=registry.on_change)
+    add_cameras(scheduler, 2)
+    assert scheduler.assignment(0).record
+    restarts = dict(registry.restarts)
+    # The third camera takes the recording session of the first one, which keeps streaming in the same mode
+    scheduler.add_camera(2, 0)
+    assert not scheduler.assignment(0).record
+    assert registry.restarts[0] == restarts[0]
+    assert registry.restarts[2] == 1
+
+
+def test_needs_restart():
+    assignment = Assignment(1, True, True, HD2K)
+    assert not needs_restart(assignment, assignment)
+    assert not needs_restart(assignment, assignment._replace(record=False))
+    assert needs_restart(assignment, assignment._replace(mode=HD1080))
+    assert needs_restart(None, assignment)
+    assert needs_restart(assignment, None)
+    assert not needs_restart(None, None)
@@ -0,0 +1,236 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_stream_loop.py
+# The ZED SDK is not needed : main.py is loaded with a fake pyzed, a fake camera and a fake ZED Hub client.
+
+import enum
+import importlib.util
+import os
+import queue
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class ERROR_CODE(enum.Enum):
+    SUCCESS = 0
+    CAMERA_NOT_DETECTED = 1
+
+
+class FakeMat:
+    def __init__(self, width, height, mat_type):
+        self.array = np.zeros((height, width, 4), dtype=np.uint8)
+        self.frame = None
+
+    def get_data(self, memory_type, deep_copy):
+        return self.array
+
+    def get_resolution(self):
+        return self.array.shape[1], self.array.shape[0]
+
+
+# Grabs `frames` images then fails, or sets `interrupt` after `interrupt_after` images.
+# Records any call made while another one is still running, the camera is not thread safe.
+class FakeCamera:
+    def __init__(self, frames, interrupt=None, interrupt_after=None, duration=0.002):
+        self.frames = frames
+        self.interrupt = interrupt
+        self.interrupt_after = interrupt_after
+        self.duration = duration
+        self.grabbed = 0
+        self.busy = False
+        self.overlaps = []
+
+    def call(self, name):
+        if self.busy:
+            self.overlaps.append(name)
+        self.busy = True
+        time.sleep(self.duration)
+        self.busy = False
+
+    def grab(self):
+        self.call("grab")
+        if self.grabbed == self.frames:
+            return ERROR_CODE.CAMERA_NOT_DETECTED
+        self.grabbed += 1
+        if self.interrupt is not None and self.grabbed == self.interrupt_after:
+            self.interrupt.set()
+        return ERROR_CODE.SUCCESS
+
+    def retrieve_image(self, mat, view, memory_type, resolution):
+        self.call("retrieve_image")
+        mat.frame = self.grabbed
+
+
+class FakeHubClient:
+    def __init__(self):
+        self.uploads = []
+        self.threads = set()
+
+    def update(self, zed, mat):
+        zed.call("update")
+        self.uploads.append(mat.frame)
+        self.threads.add(threading.current_thread().name)
+
+
+def load_module(monkeypatch, name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def client():
+    return FakeHubClient()
+
+
+@pytest.fixture
+def main(monkeypatch, client):
+    sl = types.ModuleType("pyzed.sl")
+    sl.Mat = FakeMat
+    sl.Camera = FakeCamera
+    sl.ERROR_CODE = ERROR_CODE
+    sl.MAT_TYPE = types.SimpleNamespace(U8_C4=0)
+    sl.MEM = types.SimpleNamespace(CPU=0)
+    sl.VIEW = types.SimpleNamespace(LEFT=0)
+    hub = types.ModuleType("pyzed.sl_hub")
+    hub.HubClient = client
+    hub.LOG_LEVEL = types.SimpleNamespace(DEBUG=0, INFO=1, WARNING=2, ERROR=3)
+    pyzed = types.ModuleType("pyzed")
+    pyzed.sl = sl
+    pyzed.sl_hub = hub
+    for name, module in (("pyzed", pyzed), ("pyzed.sl", sl), ("pyzed.sl_hub", hub)):
+        monkeypatch.setitem(sys.modules, name, module)
+    # main.py imports its neighbours by name, they are loaded with the fake pyzed too
+    for name in ("hub_logging", "encoder_scheduler"):
+        load_module(monkeypatch, name, os.path.join(DIRECTORY, name + ".py"))
+    return load_module(monkeypatch, "multi_cam_stream_main", os.path.join(DIRECTORY, "main.py"))
+
+
+def test_buffers_are_preallocated_with_the_image_size(main):
+    pool = main.FramePool(2, 64, 32)
+    buffers = [pool.acquire(), pool.acquire()]
+    assert buffers[0] is not buffers[1]
+    for buffer in buffers:
+        assert buffer.data.shape[:2] == (32, 64)
+
+
+def test_released_buffer_is_reused_without_copy(main):
+    pool = main.FramePool(1, 16, 16)
+    buffer = pool.acquire()
+    buffer.data[0, 0, 0] = 42
+    pool.release(buffer)
+    reused = pool.acquire()
+    assert reused is buffer
+    assert reused.data[0, 0, 0] == 42
+
+
+def test_acquire_waits_for_a_release_when_all_buffers_are_in_use(main):
+    pool = main.FramePool(2, 16, 16)
+    first = pool.acquire()
+    pool.acquire()
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    thread.start()
+    time.sleep(0.1)
+    assert acquired == []
+    pool.release(first)
+    thread.join(timeout=1.0)
+    assert acquired == [first]
+
+
+@pytest.mark.parametrize("size", [1, 2, 4])
+def test_a_buffer_has_a_single_owner_at_a_time(main, size):
+    pool = main.FramePool(size, 16, 16)
+    owners = {}
+    errors = []
+    lock = threading.Lock()
+
+    def use(worker):
+        for _ in range(200):
+            buffer = pool.acquire()
+            with lock:
+                if id(buffer) in owners:
+                    errors.append(worker)
+                owners[id(buffer)] = worker
+            time.sleep(0)
+            with lock:
+                del owners[id(buffer)]
+            pool.release(buffer)
+
+    threads = [threading.Thread(target=use, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    # Every buffer is back in the pool
+    assert pool.free.qsize() == size
+
+
+def test_every_grabbed_frame_is_uploaded_in_order(main, client):
+    camera = FakeCamera(50)
+    metrics = main.CameraMetrics()
+    status = main.stream_loop(camera, threading.Event(), metrics)
+    # The loop ends on the failed grab, once the upload thread is done
+    assert status == ERROR_CODE.CAMERA_NOT_DETECTED
+    assert client.uploads == list(range(1, 51))
+    assert threading.current_thread().name not in client.threads
+    report = metrics.report()
+    assert report["fps"] > 0
+    assert report["upload_latency_ms"] > 0
+
+
+def test_camera_calls_never_overlap(main, client):
+    camera = FakeCamera(100, duration=0.001)
+    main.stream_loop(camera, threading.Event(), main.CameraMetrics())
+    assert len(client.uploads) == 100
+    assert camera.overlaps == []
+
+
+def test_interrupted_stream_uploads_its_last_frame_and_stops(main, client):
+    interrupted = threading.Event()
+    camera = FakeCamera(1000, interrupted, interrupt_after=10)
+    status = main.stream_loop(camera, interrupted, main.CameraMetrics())
+    assert status == ERROR_CODE.SUCCESS
+    assert client.uploads == list(range(1, 11))
+
+
+def test_upload_loop_gives_every_buffer_back(main, client):
+    pool = main.FramePool(2, 16, 16)
+    frames = queue.Queue()
+    camera = FakeCamera(0)
+    for frame in range(2):
+        buffer = pool.acquire()
+        buffer.mat.frame = frame
+        frames.put(buffer)
+    frames.put(None)
+    main.upload_loop(camera, threading.Lock(), pool, frames, main.CameraMetrics())
+    assert client.uploads == [0, 1]
+    assert pool.free.qsize() == 2
@@ -0,0 +1,190 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import argparse
+import json
+import time
+import numpy as np
+from bodies_encoder import BodiesEncoder, BodiesDecoder, BodySnapshot
+
+KEYPOINTS = 38
+
+
+#
+# \brief Record the bodies of a SVO file with the ZED SDK body tracking
+# \return list of (timestamp in ms, list of BodySnapshot)
+#
+def record_svo(svo_path, max_frames):
+    import pyzed.sl as sl
+    from bodies_encoder import snapshot_bodies
+
+    init_params = sl.InitParameters()
+    init_params.set_from_svo_file(svo_path)
+    init_params.svo_real_time_mode = False
+    init_params.depth_mode = sl.DEPTH_MODE.ULTRA
+    init_params.coordinate_system = sl.COORDINATE_SYSTEM.RIGHT_HANDED_Y_UP
+    init_params.coordinate_units = sl.UNIT.METER
+    zed = sl.Camera()
+    err = zed.open(init_params)
+    if err != sl.ERROR_CODE.SUCCESS:
+        print("Error:", err)
+        exit(1)
+    zed.enable_positional_tracking(sl.PositionalTrackingParameters())
+    body_track_params = sl.BodyTrackingParameters()
+    body_track_params.enable_tracking = True
+    body_track_params.body_format = sl.BODY_FORMAT.BODY_38
+    body_track_params.detection_model = sl.BODY_TRACKING_MODEL.HUMAN_BODY_ACCURATE
+    err = zed.enable_body_tracking(body_track_params)
+    if err != sl.ERROR_CODE.SUCCESS:
+        print("Error:", err)
+        zed.close()
+        exit(1)
+
+    body_track_rt_params = sl.BodyTrackingRuntimeParameters()
+    body_track_rt_params.detection_confidence_threshold = 50
+    bodies = sl.Bodies()
+    frames = []
+    while len(frames) < max_frames and zed.grab() == sl.ERROR_CODE.SUCCESS:
+        zed.retrieve_bodies(bodies, body_track_rt_params)
+        frames.append((bodies.timestamp.get_milliseconds(), snapshot_bodies(bodies)))
+    zed.close()
+    return frames
+
+
+#
+# \brief Bodies walking back and forth in front of the camera, standing in for a recording
+#
+def synthetic_frames(frame_count, body_count, fps=20, seed=0):
+    rng = np.random.default_rng(seed)
+    skeletons = rng.normal(0.0, 0.3, (body_count, KEYPOINTS, 3)).astype(np.float32)
+    skeletons[:, :, 1] += 1.0
+    starts = rng.uniform(-3.0, 3.0, (body_count, 3)).astype(np.float32)
+    amplitudes = rng.uniform(-2.0, 2.0, (body_count, 3)).astype(np.float32)
+    amplitudes[:, 1] = 0.0
+    # Some bodies stand still
+    amplitudes[::3] = 0.0
+    frames = []
+    for i in range(frame_count):
+        t = i / fps
+        bodies = []
+        for b in range(body_count):
+            keypoint = (skeletons[b] + starts[b] + amplitudes[b] * np.sin(t / 4) + rng.normal(0.0, 0.002, (KEYPOINTS, 3))).astype(np.float32)
+            keypoint_2d = 640 + keypoint[:, [0, 1]] * np.array([200.0, -200.0], dtype=np.float32)
+            confidence = np.full(KEYPOINTS, 90.0, dtype=np.float32)
+            bodies.append(BodySnapshot(b, 1, keypoint, keypoint_2d, confidence))
+        frames.append((int(t * 1000), bodies))
+    return frames
+
+
+def save_frames(path, frames):
+    rows = [(frame, body) for frame, (timestamp, bodies) in enumerate(frames) for body in bodies]
+    np.savez_compressed(path,
+                        timestamps=np.array([timestamp for timestamp, bodies in frames], dtype=np.int64),
+                        frame=np.array([frame for frame, body in rows], dtype=np.int32),
+                        id=np.array([body.id for frame, body in rows], dtype=np.int32),
+                        tracking_state=np.array([body.tracking_state for frame, body in rows], dtype=np.int32),
+                        keypoint=np.array([body.keypoint for frame, body in rows], dtype=np.float32).reshape(-1, KEYPOINTS, 3),
+                        keypoint_2d=np.array([body.keypoint_2d for frame, body in rows], dtype=np.float32).reshape(-1, KEYPOINTS, 2),
+                        keypoint_confidence=np.array([body.keypoint_confidence for frame, body in rows], dtype=np.float32).reshape(-1, KEYPOINTS))
+
+
+def load_frames(path):
+    with np.load(path) as npz:
+        data = {name: npz[name] for name in npz.files}
+    frames = [(int(timestamp), []) for timestamp in data["timestamps"]]
+    for i in range(len(data["frame"])):
+        frames[data["frame"][i]][1].append(BodySnapshot(int(data["id"][i]), int(data["tracking_state"][i]), data["keypoint"][i],
+                                                         data["keypoint_2d"][i], data["keypoint_confidence"][i]))
+    return frames
+
+
+# Size of the bodies sent as float arrays, and as JSON
+def raw_size(bodies):
+    return sum([8 + 4 * (body.keypoint.size + body.keypoint_2d.size + body.keypoint_confidence.size) for body in bodies])
+
+
+def json_size(bodies):
+    return len(json.dumps([{"id": body.id, "tracking_state": body.tracking_state,
+                            "keypoint": np.nan_to_num(body.keypoint).tolist(), "keypoint_2d": np.nan_to_num(body.keypoint_2d).tolist(),
+                            "keypoint_confidence": np.nan_to_num(body.keypoint_confidence).tolist()} for body in bodies]))
+
+
+def run(frames, encoder, compress):
+    decoder = BodiesDecoder(KEYPOINTS, compress)
+    sent_frames = 0
+    sent_bytes = 0
+    max_error = 0.0
+    cpu_time = 0.0
+    for timestamp, bodies in frames:
+        start = time.process_time()
+        payload = encoder.encode(timestamp, bodies)
+        cpu_time += time.process_time() - start
+        if payload is None:
+            continue
+        sent_frames += 1
+        sent_bytes += len(payload)
+        decoded = {body.id: body for body in decoder.decode(payload)[1]}
+        for body in bodies:
+            error = np.nanmax(np.abs(decoded[body.id].keypoint - body.keypoint), initial=0.0)
+            max_error = max(max_error, float(error))
+    return sent_frames, sent_bytes, cpu_time, max_error
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--svo", help="Record the bodies of this SVO file with the ZED SDK", default="")
+    parser.add_argument("--recording", help="Load the bodies recorded in this .npz file", default="")
+    parser.add_argument("--save", help="Save the bodies benchmarked in this .npz file", default="")
+    parser.add_argument("--frames", help="Maximum number of frames", type=int, default=1000)
+    parser.add_argument("--bodies", help="Number of bodies of the synthetic recording", type=int, default=6)
+    parser.add_argument("--keyframe_interval", help="Frames between two keyframes", type=int, default=30)
+    parser.add_argument("--threshold", help="Minimum keypoint move for a body to be sent, in meters", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.svo != "":
+        frames = record_svo(args.svo, args.frames)
+    elif args.recording != "":
+        frames = load_frames(args.recording)[:args.frames]
+    else:
+        frames = synthetic_frames(args.frames, args.bodies)
+    if args.save != "":
+        save_frames(args.save, frames)
+    if len(frames) == 0:
+        print("No frame to benchmark")
+        exit(1)
+
+    frame_count = len(frames)
+    print(frame_count, "frames,", round(sum([len(bodies) for timestamp, bodies in frames]) / frame_count, 1), "bodies per frame")
+    print("float arrays        :", round(sum([raw_size(bodies) for timestamp, bodies in frames]) / frame_count), "bytes/frame")
+    print("json                :", round(sum([json_size(bodies) for timestamp, bodies in frames]) / frame_count), "bytes/frame")
+    configurations = [
+        ("fixed-point only", BodiesEncoder(keyframe_interval=1, threshold=0.0, threshold_2d=0.0, compress=False), False),
+        ("keyframes + deltas", BodiesEncoder(args.keyframe_interval, threshold=0.0, threshold_2d=0.0, compress=False), False),
+        ("+ threshold", BodiesEncoder(args.keyframe_interval, args.threshold, compress=False), False),
+        ("+ zlib", BodiesEncoder(args.keyframe_interval, args.threshold, compress=True), True),
+    ]
+    for name, encoder, compress in configurations:
+        sent_frames, sent_bytes, cpu_time, max_error = run(frames, encoder, compress)
+        print(name.ljust(20), ":", round(sent_bytes / frame_count), "bytes/frame,", sent_frames, "frames sent,",
+              round(cpu_time / frame_count * 1e6), "us CPU/frame, max error", round(max_error * 1000, 1), "mm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+import numpy as np
+import struct
+import zlib
+from collections import namedtuple
+
+# Body as plain arrays : keypoint (38, 3) in meters, keypoint_2d (38, 2) in pixels, keypoint_confidence (38,) in [0, 100]
+BodySnapshot = namedtuple("BodySnapshot", ["id", "tracking_state", "keypoint", "keypoint_2d", "keypoint_confidence"])
+
+# Tracking states are encoded as their index in this list, the names of sl.OBJECT_TRACKING_STATE.
+# The encoder and decoder do not need the ZED SDK, only snapshot_bodies() maps the sl values.
+TRACKING_STATES = ["OFF", "OK", "SEARCHING", "TERMINATE"]
+
+# Fixed-point scales : millimeters for 3D keypoints, quarter of pixel for 2D keypoints
+KEYPOINT_SCALE = 1000.0
+KEYPOINT_2D_SCALE = 4.0
+# Quantized value of a NaN (not detected) keypoint
+INVALID = -32768
+
+KEYFRAME = 0
+DELTA_FRAME = 1
+FULL_BODY = 0
+DELTA_BODY = 1
+
+# frame type, timestamp in ms, number of bodies, number of removed bodies
+FRAME_HEADER = struct.Struct("<BQHH")
+# id, tracking state, body encoding
+BODY_HEADER = struct.Struct("<iBB")
+
+
+#
+# \brief Copy the bodies of a sl.Bodies into BodySnapshot
+#
+def snapshot_bodies(bodies):
+    import pyzed.sl as sl
+    tracking_state_index = {getattr(sl.OBJECT_TRACKING_STATE, name): i for i, name in enumerate(TRACKING_STATES)}
+    return [BodySnapshot(body.id, tracking_state_index.get(body.tracking_state, 0),
+                         np.asarray(body.keypoint, dtype=np.float32), np.asarray(body.keypoint_2d, dtype=np.float32),
+                         np.asarray(body.keypoint_confidence, dtype=np.float32))
+            for body in bodies.body_list]
+
+
+def quantize(values, scale):
+    quantized = np.round(np.nan_to_num(values, nan=0.0) * scale)
+    quantized = np.clip(quantized, -32767, 32767).astype(np.int16)
+    quantized[np.isnan(values)] = INVALID
+    return quantized
+
+
+def dequantize(quantized, scale):
+    values = quantized.astype(np.float32) / scale
+    values[quantized == INVALID] = np.nan
+    return values
+
+
+# Quantized body : id, tracking state, int16 keypoints (38 * 3 + 38 * 2) and uint8 confidences
+QuantizedBody = namedtuple("QuantizedBody", ["id", "tracking_state", "keypoints", "confidence"])
+
+
+def quantize_body(body):
+    keypoints = np.concatenate((quantize(body.keypoint, KEYPOINT_SCALE).ravel(),
+                                quantize(body.keypoint_2d, KEYPOINT_2D_SCALE).ravel()))
+    confidence = np.clip(np.nan_to_num(body.keypoint_confidence, nan=0.0), 0, 100).astype(np.uint8)
+    return QuantizedBody(body.id, body.tracking_state, keypoints, confidence)
+
+
+def dequantize_body(body):
+    split = len(body.keypoints) // 5 * 3
+    keypoint = dequantize(body.keypoints[:split], KEYPOINT_SCALE).reshape(-1, 3)
+    keypoint_2d = dequantize(body.keypoints[split:], KEYPOINT_2D_SCALE).reshape(-1, 2)
+    return BodySnapshot(body.id, body.tracking_state, keypoint, keypoint_2d, body.confidence.astype(np.float32))
+
+
+#
+# \brief Compact encoding of a bodies stream : fixed-point keyframes, then per-body int8 deltas to the last sent value.
+# A body that moved less than `threshold` (meters, on every 3D keypoint) and kept its tracking state is not sent,
+# and a frame in which no body changed is not sent at all. Every `keyframe_interval` frames, sent or not, a keyframe
+# is sent so that a receiver joining the stream, or having lost a frame, resynchronizes, even on a static scene.
+#
+class BodiesEncoder:
+    def __init__(self, keyframe_interval=30, threshold=0.01, threshold_2d=2.0, compress=True):
+        self.keyframe_interval = keyframe_interval
+        self.threshold = int(round(threshold * KEYPOINT_SCALE))
+        self.threshold_2d = int(round(threshold_2d * KEYPOINT_2D_SCALE))
+        self.compress = compress
+        # Last sent quantized body of each id, the reference of the deltas
+        self.sent = {}
+        self.frames_since_keyframe = keyframe_interval
+
+    def force_keyframe(self):
+        self.frames_since_keyframe = self.keyframe_interval
+
+    def has_moved(self, body, reference):
+        if body.tracking_state != reference.tracking_state:
+            return True
+        difference = np.abs(body.keypoints.astype(np.int32) - reference.keypoints.astype(np.int32))
+        split = len(difference) // 5 * 3
+        return bool(difference[:split].max(initial=0) >= self.threshold or difference[split:].max(initial=0) >= self.threshold_2d)
+
+    #
+    # \brief Decide which bodies (list of BodySnapshot) of a frame are sent and make them the new references,
+    # without encoding them. Use it instead of encode() when the frame itself is sent by other means.
+    # \return (keyframe, [(quantized body, reference or None)], removed ids), or None if nothing changed since the last sent frame
+    #
+    def select(self, bodies):
+        quantized_bodies = [quantize_body(body) for body in bodies]
+        keyframe = self.frames_since_keyframe >= self.keyframe_interval
+        # Every frame counts, so that a keyframe is sent even if no body moved since the last one
+        if keyframe:
+            self.frames_since_keyframe = 0
+        self.frames_since_keyframe += 1
+
+        changes = []
+        if keyframe:
+            removed = []
+            for body in quantized_bodies:
+                changes.append((body, None))
+        else:
+            ids = set([body.id for body in quantized_bodies])
+            removed = [body_id for body_id in self.sent if body_id not in ids]
+            for body in quantized_bodies:
+                reference = self.sent.get(body.id)
+                if reference is None or self.has_moved(body, reference):
+                    changes.append((body, reference))
+            if len(changes) == 0 and len(removed) == 0:
+                return None
+
+        if keyframe:
+            self.sent = {}
+        for body_id in removed:
+            del self.sent[body_id]
+        for body, reference in changes:
+            self.sent[body.id] = body
+        return keyframe, changes, removed
+
+    #
+    # \brief Encode the bodies (list of BodySnapshot) of a frame
+    # \return the frame as bytes, or None if nothing changed since the last sent frame
+    #
+    def encode(self, timestamp, bodies):
+        selection = self.select(bodies)
+        if selection is None:
+            return None
+        keyframe, changes, removed = selection
+        records = [self.full_record(body) if reference is None else self.delta_record(body, reference) for body, reference in changes]
+
+        payload = FRAME_HEADER.pack(KEYFRAME if keyframe else DELTA_FRAME, timestamp, len(records), len(removed))
+        payload += np.array(removed, dtype=np.int32).tobytes()
+        payload += b"".join(records)
+        if self.compress:
+            payload = zlib.compress(payload, 1)
+        return payload
+
+    def full_record(self, body):
+        return BODY_HEADER.pack(body.id, body.tracking_state, FULL_BODY) + body.keypoints.tobytes() + body.confidence.tobytes()
+
+    def delta_record(self, body, reference):
+        delta = body.keypoints.astype(np.int32) - reference.keypoints.astype(np.int32)
+        # A keypoint appearing or disappearing, or moving too much, is not representable as an int8 delta
+        if np.any((body.keypoints == INVALID) != (reference.keypoints == INVALID)) or np.abs(delta).max(initial=0) > 127:
+            return self.full_record(body)
+        confidence_delta = body.confidence.astype(np.int16) - reference.confidence.astype(np.int16)
+        return (BODY_HEADER.pack(body.id, body.tracking_state, DELTA_BODY)
+                + delta.astype(np.int8).tobytes() + confidence_delta.astype(np.int8).tobytes())
+
+
+#
+# \brief Rebuild the bodies from the frames of a BodiesEncoder
+#
+class BodiesDecoder:
+    def __init__(self, keypoints=38, compress=True):
+        self.keypoints = keypoints
+        self.compress = compress
+        self.bodies = {}
+
+    #
+    # \return the timestamp of the frame and the list of BodySnapshot of all the bodies known after it
+    #
+    def decode(self, payload):
+        if self.compress:
+            payload = zlib.decompress(payload)
+        frame_type, timestamp, body_count, removed_count = FRAME_HEADER.unpack_from(payload)
+        offset = FRAME_HEADER.size
+        if frame_type == KEYFRAME:
+            self.bodies = {}
+        for body_id in np.frombuffer(payload, dtype=np.int32, count=removed_count, offset=offset):
+            self.bodies.pop(int(body_id), None)
+        offset += removed_count * 4
+
+        values = self.keypoints * 5
+        for i in range(body_count):
+            body_id, tracking_state, encoding = BODY_HEADER.unpack_from(payload, offset)
+            offset += BODY_HEADER.size
+            if encoding == FULL_BODY:
+                keypoints = np.frombuffer(payload, dtype=np.int16, count=values, offset=offset).copy()
+                offset += values * 2
+                confidence = np.frombuffer(payload, dtype=np.uint8, count=self.keypoints, offset=offset).copy()
+            else:
+                reference = self.bodies[body_id]
+                keypoints = (reference.keypoints + np.frombuffer(payload, dtype=np.int8, count=values, offset=offset)).astype(np.int16)
+                offset += values
+                confidence = (reference.confidence + np.frombuffer(payload, dtype=np.int8, count=self.keypoints, offset=offset)).astype(np.uint8)
+            offset += self.keypoints
+            self.bodies[body_id] = QuantizedBody(body_id, tracking_state, keypoints, confidence)
+        return timestamp, [dequantize_body(body) for body in self.bodies.values()]
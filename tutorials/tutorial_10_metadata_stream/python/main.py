@@ -22,6 +22,8 @@
 import pyzed.sl as sl
 import pyzed.sl_hub as hub
 import cv2
+import numpy as np
+from bodies_encoder import BodiesEncoder, snapshot_bodies
 
 colors = [
     [232, 176, 244],
@@ -34,8 +36,38 @@ colors = [
     [194, 72, 113]
  ]
 
-def cvt(pt, scale):
-    return[pt[0] * scale[0], pt[1] * scale[1]]
+# Skeleton bones as pairs of keypoint indices, looked up once
+bones = np.array([[sl.get_idx_38(limb[0]), sl.get_idx_38(limb[1])] for limb in sl.BODY_38_BONES], dtype=np.int32)
+
+# Draw the 2D skeletons of all the tracked bodies. Keypoints of every body are scaled and bounds-checked
+# in a single numpy operation, then joints and bones are drawn with one cv2.polylines call per color.
+def draw_skeletons(cv_image, bodies, img_scale):
+    tracked_bodies = [body for body in bodies.body_list if body.tracking_state == sl.OBJECT_TRACKING_STATE.OK]
+    if len(tracked_bodies) == 0:
+        return
+
+    # (bodies, keypoints, 2)
+    keypoints = np.array([body.keypoint_2d for body in tracked_bodies], dtype=np.float32) * np.array(img_scale, dtype=np.float32)
+    height, width = cv_image.shape[:2]
+    visible = (keypoints[..., 0] > 0) & (keypoints[..., 0] < width) & (keypoints[..., 1] > 0) & (keypoints[..., 1] < height)
+    keypoints = keypoints.astype(np.int32)
+
+    # (bodies, bones, 2 ends, 2)
+    bone_segments = keypoints[:, bones]
+    visible_bones = visible[:, bones[:, 0]] & visible[:, bones[:, 1]]
+    # Joints as zero-length segments, drawn as discs by a thick line
+    joint_segments = np.repeat(keypoints[:, :, None, :], 2, axis=2)
+
+    color_ids = np.array([body.id % len(colors) for body in tracked_bodies])
+    for color_id in np.unique(color_ids):
+        same_color = color_ids == color_id
+        color = colors[color_id]
+        joints = joint_segments[same_color][visible[same_color]]
+        if len(joints) > 0:
+            cv2.polylines(cv_image, joints, False, color, 6)
+        limbs = bone_segments[same_color][visible_bones[same_color]]
+        if len(limbs) > 0:
+            cv2.polylines(cv_image, limbs, False, color, 1)
 
 
 def main():
@@ -113,6 +145,10 @@ def main():
 
     # Bodies to be streamed to ZED Hub
     bodies = sl.Bodies()
+    # Frames in which no body moved more than 1cm are not streamed, except one every 30 frames (keyframe).
+    # Only the selection of the encoder is used here, bodies_encoder.encode() builds the compact payload
+    # that an application would send on its own constrained link (see benchmark_bodies_encoder.py).
+    bodies_encoder = BodiesEncoder(keyframe_interval=30, threshold=0.01)
 
     # Main loop
     while True:
@@ -129,31 +165,15 @@ def main():
         zed.retrieve_bodies(bodies, body_track_rt_params)
 
         # Draw 2D skeletons
-        for body in bodies.body_list:
-            if body.tracking_state == sl.OBJECT_TRACKING_STATE.OK:
-                color = colors[body.id % len(colors)]
-                
-                # Skeleton joints
-                for kp in body.keypoint_2d:
-                    cv_kp = cvt(kp, img_scale)
-                
-                    if cv_kp[0] < cv_image.shape[1] and cv_kp[1] < cv_image.shape[0]:
-                        cv2.circle(cv_image, (int(cv_kp[0]), int(cv_kp[1])), 3, color, -1)
-
-                # Skeleton bones
-                for limb in sl.BODY_38_BONES:
-                    kp_a = cvt(body.keypoint_2d[sl.get_idx_34(limb[0])], img_scale)
-                    kp_b = cvt(body.keypoint_2d[sl.get_idx_34(limb[1])], img_scale)
-
-                    if 0 < kp_a[0] < cv_image.shape[1] and 0 < kp_a[1] < cv_image.shape[0] and 0 < kp_b[0] < cv_image.shape[1] and 0 < kp_b[1] < cv_image.shape[0]:
-                        cv2.line(cv_image, (int(kp_a[0]), int(kp_a[1])), (int(kp_b[0]), int(kp_b[1])), color, 1)
+        draw_skeletons(cv_image, bodies, img_scale)
 
         # Always update Hub at the end of the grab loop to stream data to ZED Hub
         # Update the video stream/recording
         hub.HubClient.update(zed, image)
 
         # Update the sl.Bodies stream
-        hub.HubClient.update_bodies(zed, bodies)
+        if bodies_encoder.select(snapshot_bodies(bodies)) is not None:
+            hub.HubClient.update_bodies(zed, bodies)
     
     # Handling camera error
     if status_zed != sl.ERROR_CODE.SUCCESS:
@@ -0,0 +1,107 @@
+########################################################################
+#
+# Copyright (c) 2023, STEREOLABS.
+#
+# All rights reserved.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+########################################################################
+
+# Run with : python3 -m pytest test_bodies_encoder.py
+# The ZED SDK is not needed, the bodies are synthetic.
+
+import numpy as np
+import pytest
+
+from benchmark_bodies_encoder import KEYPOINTS, run, synthetic_frames
+from bodies_encoder import BodiesDecoder, BodiesEncoder, BodySnapshot
+
+
+def make_body(body_id, offset=0.0, tracking_state=1, seed=0):
+    rng = np.random.default_rng(seed + body_id)
+    keypoint = (rng.normal(0.0, 0.3, (KEYPOINTS, 3)) + offset).astype(np.float32)
+    keypoint_2d = rng.uniform(0.0, 1280.0, (KEYPOINTS, 2)).astype(np.float32)
+    confidence = rng.uniform(0.0, 100.0, KEYPOINTS).astype(np.float32)
+    return BodySnapshot(body_id, tracking_state, keypoint, keypoint_2d, confidence)
+
+
+def check_decoded(decoded, bodies):
+    decoded = {body.id: body for body in decoded}
+    assert sorted(decoded) == sorted(body.id for body in bodies)
+    for body in bodies:
+        result = decoded[body.id]
+        assert result.tracking_state == body.tracking_state
+        np.testing.assert_array_equal(np.isnan(result.keypoint), np.isnan(body.keypoint))
+        # Millimeters in 3D, quarter of pixel in 2D, integer confidences
+        assert np.nanmax(np.abs(result.keypoint - body.keypoint)) <= 0.0005 + 1e-6
+        assert np.max(np.abs(result.keypoint_2d - body.keypoint_2d)) <= 0.125 + 1e-4
+        assert np.max(np.abs(result.keypoint_confidence - np.floor(body.keypoint_confidence))) == 0
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_keyframe_roundtrip(compress):
+    bodies = [make_body(i) for i in range(3)]
+    bodies[1].keypoint[5] = np.nan
+    encoder = BodiesEncoder(compress=compress)
+    decoder = BodiesDecoder(KEYPOINTS, compress)
+    timestamp, decoded = decoder.decode(encoder.encode(1234, bodies))
+    assert timestamp == 1234
+    check_decoded(decoded, bodies)
+
+
+def test_deltas_roundtrip_moving_appearing_and_removed_bodies():
+    encoder = BodiesEncoder(keyframe_interval=100, threshold=0.01)
+    decoder = BodiesDecoder(KEYPOINTS)
+    for frame in range(20):
+        # Body 0 walks, body 1 stands still, body 2 leaves at frame 10, body 3 comes in at frame 5
+        bodies = [make_body(0, offset=0.02 * frame), make_body(1)]
+        if frame < 10:
+            bodies.append(make_body(2, offset=0.05 * frame))
+        if frame >= 5:
+            bodies.append(make_body(3, offset=1.0 + 0.03 * frame, tracking_state=2 if frame < 8 else 1))
+        payload = encoder.encode(frame, bodies)
+        assert payload is not None
+        check_decoded(decoder.decode(payload)[1], bodies)
+
+
+def test_large_move_and_lost_keypoint_fall_back_to_a_full_body():
+    encoder = BodiesEncoder(keyframe_interval=100)
+    decoder = BodiesDecoder(KEYPOINTS)
+    decoder.decode(encoder.encode(0, [make_body(0)]))
+    # 1 m in a frame does not fit an int8 delta of millimeters
+    moved = make_body(0, offset=1.0)
+    moved.keypoint[0] = np.nan
+    check_decoded(decoder.decode(encoder.encode(1, [moved]))[1], [moved])
+
+
+def test_static_scene_sends_only_keyframes():
+    encoder = BodiesEncoder(keyframe_interval=10, threshold=0.01)
+    decoder = BodiesDecoder(KEYPOINTS)
+    bodies = [make_body(0), make_body(1)]
+    sent = []
+    for frame in range(35):
+        payload = encoder.encode(frame, bodies)
+        if payload is not None:
+            sent.append(frame)
+            check_decoded(decoder.decode(payload)[1], bodies)
+    assert sent == [0, 10, 20, 30]
+
+
+def test_synthetic_recording_roundtrip():
+    frames = synthetic_frames(60, 4)
+    sent_frames, sent_bytes, cpu_time, max_error = run(frames, BodiesEncoder(keyframe_interval=30, threshold=0.01), True)
+    assert 0 < sent_frames <= 60
+    assert sent_bytes > 0
+    # Bodies that moved less than the threshold are not sent again
+    assert max_error < 0.01 + 0.0005